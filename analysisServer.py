@@ -0,0 +1,409 @@
+"""
+Analysis service: an asyncio server on a local socket that hands positions to a fixed pool of persistent
+search worker processes.
+
+The protocol is line-delimited JSON. Requests:
+    {"id": 1, "fen": "...", "moves": ["e2e4", "e7e5"], "depth": 3, "movetime": 1.0, "timeout": 5.0, "multipv": 3}
+        Search the position given by fen (default: the start position) after playing the UCI moves.
+        depth and movetime (seconds) bound the search, timeout (seconds) is the deadline for the whole request
+        including time spent queued. Without a depth the search runs until the time limit, or to the default
+        depth when there is no time limit either.
+        With multipv the response also ranks that many best moves under "lines".
+    {"cancel": 1}
+        Cancel request 1, whether it is still queued or already being searched.
+    {"stats": true}
+        Server counters, throughput and latency percentiles.
+Every request gets one response line carrying its id: the move, score, pv and search stats, or an error.
+
+Usage:
+    python analysisServer.py serve --port 8765 --workers 4
+    python analysisServer.py query --port 8765 --fen "..." --depth 3
+    python analysisServer.py loadtest --port 8765 --requests 200 --connections 8
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import chessAI
+import chessEngine
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+LATENCY_WINDOW = 10000  # latencies kept for the percentiles
+
+
+def workerMain(conn, stopEvent):
+    """
+    Search worker loop. Runs in its own process for the life of the server, so module level caches
+    such as the pawn hash table are reused across requests.
+    """
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        try:
+            response = analyze(request, stopEvent)
+        except (ValueError, KeyError, TypeError) as e:
+            response = {"error": str(e)}
+        except Exception as e:
+            # Keep the worker alive: an engine bug on one position must not shrink the pool.
+            response = {"error": "engine error: %s: %s" % (type(e).__name__, e)}
+        conn.send(response)
+
+
+def validateRequest(request):
+    """
+    Raises ValueError if a search request's fields have the wrong type or range, before it reaches a worker.
+    """
+    if not isinstance(request.get("id"), (str, int, float, type(None))):
+        raise ValueError("id must be a string or a number")
+    for field in ("timeout", "movetime"):
+        value = request.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+            raise ValueError(field + " must be a non-negative number of seconds")
+    for field in ("depth", "multipv"):
+        value = request.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+            raise ValueError(field + " must be a positive integer")
+    if not isinstance(request.get("fen"), (str, type(None))):
+        raise ValueError("fen must be a string")
+    moves = request.get("moves", [])
+    if not isinstance(moves, list) or not all(isinstance(move, str) for move in moves):
+        raise ValueError("moves must be a list of UCI strings")
+
+
+def analyze(request, stopEvent):
+    gs = chessEngine.GameState(request.get("fen") or chessEngine.START_FEN)
+    for notation in request.get("moves", ()):
+        gs.makeMove(gs.getValidMoves().fromUCI(notation))
+    depth = request.get("depth")  # runWorker fills in chessAI.DEPTH when there is no time limit either
+    multiPV = request.get("multipv")
+    search = chessAI.searchPosition(gs, depth, request.get("timeLimit"), stopEvent=stopEvent,
+                                    multiPV=multiPV if multiPV is not None else 1)
+    move = search.bestMove
+    response = {"move": move.getUCINotation() if move is not None else None,
+                "san": str(move) if move is not None else None,
+                "score": round(search.score, 2),
+                "depth": search.depth,
+                "pv": [pvMove.getUCINotation() for pvMove in search.pv],
+                "stopped": stopEvent.is_set(),
+                "stats": search.stats.asDict()}
+    if multiPV is not None:
+        response["lines"] = search.linesAsDicts()
+    return response
+
+
+class Job:
+    def __init__(self, key, request, respond):
+        self.key = key
+        self.request = request
+        self.respond = respond
+        self.received = time.perf_counter()
+        timeout = request.get("timeout")
+        self.deadline = self.received + timeout if timeout is not None else None
+        self.cancelled = False
+        self.worker = None
+        self.response = None
+
+
+class Worker:
+    def __init__(self, index):
+        self.index = index
+        self.conn, childConn = multiprocessing.Pipe()
+        self.stopEvent = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=workerMain, args=(childConn, self.stopEvent), daemon=True)
+        self.process.start()
+
+
+class AnalysisServer:
+    def __init__(self, workers, maxQueue):
+        self.workers = [Worker(i) for i in range(workers)]
+        self.queue = asyncio.Queue()
+        self.maxQueue = maxQueue
+        self.jobs = {}  # (connection, request id) -> Job, for cancellation
+        self.recvExecutor = ThreadPoolExecutor(max_workers=workers)
+        self.startTime = time.perf_counter()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"received": 0, "completed": 0, "rejected": 0, "cancelled": 0, "expired": 0, "errors": 0,
+                         "respawned": 0}
+        self.busy = 0
+
+    async def start(self, host, port, unixPath):
+        for worker in self.workers:
+            asyncio.get_running_loop().create_task(self.runWorker(worker))
+        if unixPath:
+            return await asyncio.start_unix_server(self.handleConnection, path=unixPath)
+        return await asyncio.start_server(self.handleConnection, host, port)
+
+    def close(self):
+        for worker in self.workers:
+            worker.stopEvent.set()
+            worker.process.terminate()
+        self.recvExecutor.shutdown(wait=False)
+
+    async def handleConnection(self, reader, writer):
+        connection = object()
+
+        async def respond(message):
+            writer.write((json.dumps(message) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    await respond({"error": "invalid request: " + str(e)})
+                    continue
+                if request.get("stats"):
+                    await respond(self.statistics())
+                elif "cancel" in request:
+                    await respond(self.cancel(connection, request["cancel"]))
+                else:
+                    await self.submit(connection, request, respond)
+        except ConnectionError:
+            pass
+        finally:
+            for key, job in list(self.jobs.items()):
+                if key[0] is connection:
+                    self.cancelJob(job)
+            writer.close()
+
+    async def submit(self, connection, request, respond):
+        self.counters["received"] += 1
+        requestId = request.get("id")
+        try:
+            validateRequest(request)
+        except ValueError as e:
+            self.counters["errors"] += 1
+            await respond({"id": requestId if isinstance(requestId, (str, int, float)) else None,
+                           "error": "invalid request: " + str(e)})
+            return
+        if self.queue.qsize() >= self.maxQueue:
+            # Backpressure: tell the client to retry later rather than letting the queue grow without bound.
+            self.counters["rejected"] += 1
+            await respond({"id": requestId, "error": "busy", "queueDepth": self.queue.qsize()})
+            return
+        job = Job((connection, requestId), request, respond)
+        self.jobs[job.key] = job
+        await self.queue.put(job)
+
+    def cancel(self, connection, requestId):
+        job = self.jobs.get((connection, requestId))
+        if job is None:
+            return {"cancel": requestId, "error": "unknown or finished request"}
+        self.cancelJob(job)
+        return {"cancel": requestId, "ok": True}
+
+    def cancelJob(self, job):
+        job.cancelled = True
+        if job.worker is not None:
+            job.worker.stopEvent.set()
+
+    def respawn(self, worker):
+        """
+        Replaces a worker whose process has died with a fresh one at the same index.
+        """
+        worker.process.terminate()
+        worker.process.join(1)
+        worker.conn.close()
+        replacement = Worker(worker.index)
+        self.workers[worker.index] = replacement
+        self.counters["respawned"] += 1
+        return replacement
+
+    async def runWorker(self, worker):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            requestId = job.request.get("id")
+            if job.cancelled:
+                self.finish(job, {"id": requestId, "cancelled": True}, "cancelled")
+                await self.send(job)
+                continue
+            timeLimit = job.request.get("movetime")
+            if job.deadline is not None:
+                remaining = job.deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.finish(job, {"id": requestId, "error": "deadline exceeded while queued"}, "expired")
+                    await self.send(job)
+                    continue
+                timeLimit = remaining if timeLimit is None else min(timeLimit, remaining)
+            if job.request.get("depth") is None and timeLimit is None:
+                job.request["depth"] = chessAI.DEPTH
+            task = dict(job.request, timeLimit=timeLimit)
+            if not worker.process.is_alive():
+                worker = self.respawn(worker)
+            worker.stopEvent.clear()
+            job.worker = worker
+            self.busy += 1
+            try:
+                worker.conn.send(task)
+                result = await loop.run_in_executor(self.recvExecutor, worker.conn.recv)
+            except (EOFError, OSError):
+                result = {"error": "worker process died"}
+                worker = self.respawn(worker)
+            finally:
+                self.busy -= 1
+                job.worker = None
+            result["id"] = requestId
+            result["worker"] = worker.index
+            if job.cancelled:
+                result["cancelled"] = True
+                self.finish(job, result, "cancelled")
+            elif "error" in result:
+                self.finish(job, result, "errors")
+            else:
+                self.finish(job, result, "completed")
+            await self.send(job)
+
+    def finish(self, job, response, counter):
+        self.counters[counter] += 1
+        latency = time.perf_counter() - job.received
+        if counter == "completed":
+            self.latencies.append(latency)
+        response["latency"] = round(latency, 4)
+        job.response = response
+        self.jobs.pop(job.key, None)
+
+    async def send(self, job):
+        try:
+            await job.respond(job.response)
+        except ConnectionError:
+            pass
+
+    def statistics(self):
+        elapsed = time.perf_counter() - self.startTime
+        latencies = sorted(self.latencies)
+        return {"uptime": round(elapsed, 1), "workers": len(self.workers), "busyWorkers": self.busy,
+                "queueDepth": self.queue.qsize(), "counters": self.counters,
+                "throughput": round(self.counters["completed"] / elapsed, 2) if elapsed > 0 else 0.0,
+                "latency": latencyPercentiles(latencies)}
+
+
+def latencyPercentiles(latencies):
+    """
+    p50/p90/p99/max of a sorted list of latencies in seconds.
+    """
+    if not latencies:
+        return {}
+    return {name: round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 4)
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))}
+
+
+async def serve(args):
+    server = AnalysisServer(args.workers, args.max_queue)
+    listener = await server.start(args.host, args.port, args.unix)
+    where = args.unix or "%s:%d" % (args.host, args.port)
+    print("Analysis server listening on %s with %d workers" % (where, args.workers), file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+async def openConnection(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def query(args):
+    reader, writer = await openConnection(args)
+    request = {"id": 1, "fen": args.fen, "moves": args.moves, "depth": args.depth, "movetime": args.movetime,
+               "multipv": args.multipv}
+    writer.write((json.dumps(request) + "\n").encode())
+    print((await reader.readline()).decode().strip())
+    writer.close()
+
+
+async def loadTest(args):
+    """
+    Sends args.requests searches over args.connections connections, each connection keeping one request
+    in flight at a time, and reports client side throughput and latency.
+    """
+    latencies = []
+    outcomes = {}
+    remaining = [args.requests]
+
+    async def client(connectionIndex):
+        reader, writer = await openConnection(args)
+        requestId = 0
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            requestId += 1
+            request = {"id": requestId, "fen": args.fen, "depth": args.depth, "movetime": args.movetime,
+                       "timeout": args.timeout, "multipv": args.multipv}
+            sent = time.perf_counter()
+            writer.write((json.dumps(request) + "\n").encode())
+            response = json.loads(await reader.readline())
+            if "error" in response:
+                outcome = response["error"]
+            else:
+                outcome = "ok"
+                latencies.append(time.perf_counter() - sent)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        writer.close()
+
+    startTime = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.connections)))
+    elapsed = time.perf_counter() - startTime
+    print(json.dumps({"requests": args.requests, "connections": args.connections, "elapsed": round(elapsed, 2),
+                      "throughput": round(len(latencies) / elapsed, 2), "outcomes": outcomes,
+                      "latency": latencyPercentiles(sorted(latencies))}))
+    reader, writer = await openConnection(args)
+    writer.write(b'{"stats": true}\n')
+    print((await reader.readline()).decode().strip())
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local analysis service for the chess engine.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serveParser = commands.add_parser("serve", help="run the server")
+    serveParser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of search processes")
+    serveParser.add_argument("--max-queue", type=int, default=256,
+                             help="queued requests beyond which new ones are rejected as busy")
+    queryParser = commands.add_parser("query", help="send one request and print the response")
+    loadParser = commands.add_parser("loadtest", help="measure throughput and latency against a running server")
+    loadParser.add_argument("--requests", type=int, default=100)
+    loadParser.add_argument("--connections", type=int, default=4)
+    loadParser.add_argument("--timeout", type=float, default=None, help="per request deadline in seconds")
+    for subParser in (serveParser, queryParser, loadParser):
+        subParser.add_argument("--host", default=DEFAULT_HOST)
+        subParser.add_argument("--port", type=int, default=DEFAULT_PORT)
+        subParser.add_argument("--unix", help="listen on / connect to this Unix socket instead of TCP")
+    for subParser in (queryParser, loadParser):
+        subParser.add_argument("--fen", default=chessEngine.START_FEN)
+        subParser.add_argument("--depth", type=int, default=None, help="search depth (default %d, or no limit "
+                               "when --movetime is given)" % chessAI.DEPTH)
+        subParser.add_argument("--movetime", type=float, default=None, help="search time in seconds")
+        subParser.add_argument("--multipv", type=int, default=None, help="number of ranked best moves to return")
+    queryParser.add_argument("moves", nargs="*", help="UCI moves to play from the FEN first")
+    args = parser.parse_args()
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "query":
+        asyncio.run(query(args))
+    else:
+        asyncio.run(loadTest(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Headless benchmark of the engine hot paths.
+Runs fixed workloads (move generation, evaluation, make/unmake, binary encode/decode and fixed-depth search) over a fixed set of positions,
+compares multi-PV search against single-PV search at the same depth,
+times engine import, search worker spawn and, on request, GUI start-up to the first frame,
+saves the timings as JSON and compares them against a stored baseline.
+
+Usage:
+    python benchmark.py --save-baseline         record a baseline on this machine
+    python benchmark.py --threshold 0.05        fail if any workload got more than 5% slower than the baseline
+    python benchmark.py --profile               write cProfile output for the hot functions
+"""
+
+import argparse
+import cProfile
+import json
+import multiprocessing
+import os
+import platform
+import pstats
+import statistics
+import subprocess
+import sys
+import time
+
+import chessAI
+import chessEngine
+
+POSITIONS = {
+    "start": chessEngine.START_FEN,
+    "kiwipete": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "middlegame": "r1bq1rk1/pp2ppbp/2np1np1/8/3NP3/2N1BP2/PPPQ2PP/R3KB1R w KQ - 3 9",
+    "endgame": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+}
+WORKLOADS = ("movegen", "eval", "makeunmake", "encode", "search", "multipv", "import", "spawn")
+OPTIONAL_WORKLOADS = ("firstframe",)  # needs pygame and the piece images
+PER_NODE_WORKLOADS = ("search", "multipv")  # their ops are nodes searched
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "benchmark_baseline.json")
+
+
+def loadPositions():
+    return {name: chessEngine.GameState(fen) for name, fen in POSITIONS.items()}
+
+
+def runMoveGen(states, iterations):
+    ops = 0
+    for _ in range(iterations):
+        for gs in states.values():
+            gs.getValidMoves()
+            ops += 1
+    return ops
+
+
+def runEval(states, iterations):
+    for gs in states.values():
+        gs.getValidMoves()  # sets the checkmate/stalemate flags scoreBoard reads
+    ops = 0
+    for _ in range(iterations):
+        for gs in states.values():
+            chessAI.scoreBoard(gs)
+            ops += 1
+    return ops
+
+
+def runMakeUnmake(states, iterations):
+    moves = {name: gs.getValidMoves() for name, gs in states.items()}
+    ops = 0
+    for _ in range(iterations):
+        for name, gs in states.items():
+            for move in moves[name]:
+                gs.makeMove(move)
+                gs.undoMove()
+                ops += 1
+    return ops
+
+
+def runEncode(states, iterations):
+    ops = 0
+    for _ in range(iterations):
+        for gs in states.values():
+            chessEngine.GameState.fromBytes(gs.toBytes())
+            ops += 1
+    return ops
+
+
+def runSearch(states, depth):
+    nodes = 0
+    for gs in states.values():
+        nodes += chessAI.searchPosition(gs, depth).nodes
+    return nodes
+
+
+def runMultiPV(states, depth, multiPV):
+    """
+    Searches every position once with a single PV and once with multiPV lines at the same depth.
+    Both searches are timed, so the ops are the nodes of both; the node and time ratios of multi-PV to single-PV
+    search are returned as details.
+    """
+    singleNodes = multiNodes = 0
+    singleTime = multiTime = 0.0
+    for gs in states.values():
+        single = chessAI.searchPosition(gs, depth)
+        multi = chessAI.searchPosition(gs, depth, multiPV=multiPV)
+        singleNodes += single.nodes
+        multiNodes += multi.nodes
+        singleTime += single.elapsed
+        multiTime += multi.elapsed
+    return singleNodes + multiNodes, {"multiPV": multiPV, "singlePVNodes": singleNodes, "multiPVNodes": multiNodes,
+                        "nodeRatio": multiNodes / singleNodes if singleNodes else 0.0,
+                        "timeRatio": multiTime / singleTime if singleTime > 0 else 0.0}
+
+
+def runImport(states):
+    """
+    Imports the engine and AI in a fresh interpreter, as every worker process has to.
+    Returns the per-module cumulative import times reported by -X importtime as details.
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import chessEngine, chessAI"], cwd=REPO_DIR,
+                            capture_output=True, text=True, check=True).stderr
+    importTimes = {}
+    for line in output.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() in ("chessEngine", "chessAI"):
+            importTimes[fields[2].strip()] = int(fields[1])
+    return 1, {"importMicroseconds": importTimes}
+
+
+def workerReady(conn):
+    import chessAI  # noqa: F401 - what a search worker needs before it can start
+    conn.send(True)
+
+
+def runSpawn(states):
+    """
+    Starts a search worker with the "spawn" method, the default on Windows and macOS, and waits until it is ready.
+    """
+    context = multiprocessing.get_context("spawn")
+    parentConn, childConn = context.Pipe()
+    process = context.Process(target=workerReady, args=(childConn,))
+    process.start()
+    parentConn.recv()
+    process.join()
+    return 1
+
+
+def runFirstFrame(states):
+    """
+    Starts the GUI in a fresh interpreter and exits after the first frame has been drawn.
+    """
+    env = dict(os.environ)
+    env.setdefault("SDL_VIDEODRIVER", "dummy")
+    env.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    subprocess.run([sys.executable, "-c", "import chessGUI; chessGUI.main(exitAfterFirstFrame=True)"], cwd=REPO_DIR,
+                   env=env, check=True)
+    return 1
+
+
+def workloadFunction(workload, args):
+    """
+    Returns a function that runs one repetition of the workload and returns the number of operations done,
+    or that number and a dict of extra details to report.
+    """
+    if workload == "movegen":
+        return lambda states: runMoveGen(states, args.iterations)
+    if workload == "eval":
+        return lambda states: runEval(states, args.iterations * 20)
+    if workload == "makeunmake":
+        return lambda states: runMakeUnmake(states, args.iterations)
+    if workload == "encode":
+        return lambda states: runEncode(states, args.iterations * 10)
+    if workload == "search":
+        return lambda states: runSearch(states, args.search_depth)
+    if workload == "multipv":
+        return lambda states: runMultiPV(states, args.search_depth, args.multipv)
+    if workload == "import":
+        return runImport
+    if workload == "spawn":
+        return runSpawn
+    if workload == "firstframe":
+        return runFirstFrame
+    raise ValueError("Unknown workload: " + workload)
+
+
+def timeWorkload(run, warmup, repetitions):
+    """
+    Runs the workload warmup times untimed, then repetitions times timed.
+    Every run gets freshly loaded positions, so a workload that leaves a position changed cannot affect the next run.
+    """
+    for _ in range(warmup):
+        run(loadPositions())
+    times = []
+    ops = 0
+    details = {}
+    for _ in range(repetitions):
+        states = loadPositions()
+        startTime = time.perf_counter()
+        ops = run(states)
+        times.append(time.perf_counter() - startTime)
+        if isinstance(ops, tuple):
+            ops, details = ops
+    median = statistics.median(times)
+    result = {"median": median, "min": min(times), "max": max(times), "runs": times, "ops": ops,
+              "opsPerSecond": ops / median if median > 0 else 0.0}
+    result.update(details)
+    return result
+
+
+def machineInfo():
+    return {"platform": platform.platform(), "machine": platform.machine(), "processor": platform.processor(),
+            "python": platform.python_version(), "implementation": platform.python_implementation(),
+            "cpuCount": os.cpu_count()}
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of every workload against the baseline and returns the names of those that regressed
+    by more than threshold (a fraction of the baseline median) or that cannot be compared with it.
+    The search workloads are compared by time per node, since any change to the search changes their node counts.
+    """
+    settings, baseSettings = results["settings"], baseline.get("settings", {})
+    mismatched = [key for key in settings if key in baseSettings and settings[key] != baseSettings[key]]
+    if mismatched:
+        print("Not comparable: the baseline was recorded with different settings (%s)" % ", ".join(
+            "%s %s, now %s" % (key, baseSettings[key], settings[key]) for key in mismatched))
+        return [workload for workload in results["results"] if workload in baseline["results"]]
+    failures = []
+    for workload, result in results["results"].items():
+        if workload not in baseline["results"]:
+            continue
+        base = baseline["results"][workload]
+        if workload in PER_NODE_WORKLOADS:
+            now, before, unit = result["median"] / result["ops"], base["median"] / base["ops"], "s/node"
+        elif result["ops"] != base["ops"]:
+            print("%-12s NOT COMPARABLE: %d ops now, %d in the baseline" % (workload, result["ops"], base["ops"]))
+            failures.append(workload)
+            continue
+        else:
+            now, before, unit = result["median"], base["median"], "s"
+        change = now / before - 1
+        status = "REGRESSION" if change > threshold else "ok"
+        print("%-12s %10.4g%s -> %10.4g%s  %+6.1f%%  %s" % (workload, before, unit, now, unit, change * 100, status))
+        if change > threshold:
+            failures.append(workload)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chess engine and detect performance regressions.")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma separated subset of " +
+                        ", ".join(WORKLOADS + OPTIONAL_WORKLOADS))
+    parser.add_argument("--iterations", type=int, default=20, help="passes over the positions per repetition")
+    parser.add_argument("--search-depth", type=int, default=2, help="depth of the search and multipv workloads")
+    parser.add_argument("--multipv", type=int, default=3, help="lines searched by the multipv workload")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed repetitions before measuring")
+    parser.add_argument("--repetitions", type=int, default=5, help="timed repetitions per workload")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown against the baseline as a fraction (default 0.10)")
+    parser.add_argument("--profile", nargs="?", const="benchmark.prof", metavar="FILE",
+                        help="profile the workloads with cProfile and write pstats output to FILE")
+    args = parser.parse_args()
+    workloads = [workload.strip() for workload in args.workloads.split(",") if workload.strip()]
+    for workload in workloads:
+        if workload not in WORKLOADS + OPTIONAL_WORKLOADS:
+            parser.error("unknown workload " + workload)
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        for workload in workloads:
+            run = workloadFunction(workload, args)
+            states = loadPositions()
+            profiler.runcall(run, states)
+        profiler.dump_stats(args.profile)
+        stats = pstats.Stats(args.profile)
+        stats.sort_stats("tottime").print_stats(20)
+        print("Profile written to " + args.profile)
+        return
+
+    results = {"machine": machineInfo(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "settings": {"iterations": args.iterations, "searchDepth": args.search_depth,
+                            "multiPV": args.multipv, "warmup": args.warmup, "repetitions": args.repetitions},
+               "results": {}}
+    for workload in workloads:
+        result = timeWorkload(workloadFunction(workload, args), args.warmup, args.repetitions)
+        results["results"][workload] = result
+        print("%-12s median %8.4fs  min %8.4fs  %12.1f ops/s" % (workload, result["median"], result["min"],
+                                                                  result["opsPerSecond"]))
+        if "nodeRatio" in result:
+            print("%-12s   %d lines cost %.2fx the nodes and %.2fx the time of one" % (
+                "", result["multiPV"], result["nodeRatio"], result["timeRatio"]))
+        for module, microseconds in result.get("importMicroseconds", {}).items():
+            print("%-12s   %s %.1fms" % ("", module, microseconds / 1000))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Baseline saved to " + args.baseline)
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        print("No baseline at %s, run with --save-baseline to create one" % args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
+import os
 import random
+import time
+
+import chessEngine
 
 pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
 
@@ -58,9 +62,181 @@ piecePositionScores = {"wN": knightScores,
                        "wp": pawnScores,
                        "bp": pawnScores[::-1]}
 
+# Tuned weights written by texelTuner.py replace pieceScore and the tables above when present.
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+doubledPawnPenalty = 0.2
+isolatedPawnPenalty = 0.15
+# Bonus for a passed pawn by board row, from white's point of view (row 1 is the 7th rank).
+passedPawnScores = [0.0, 0.9, 0.6, 0.35, 0.2, 0.1, 0.05, 0.0]
+
 CHECKMATE = 1000
 STALEMATE = 0
 DEPTH = 3
+MAX_DEPTH = 64
+PAWN_HASH_MB = 2
+
+nodeCount = 0
+searchDeadline = None
+searchAborted = False
+searchStopEvent = None  # set from another thread or process to stop the search early
+searchStats = None  # the SearchStats being filled in, or None when instrumentation is off
+searchCaches = []  # caches used by the search; each has name, hits and probes attributes
+
+
+class PawnHashTable:
+    """
+    Caches pawn structure scores by GameState.pawnKey.
+    The number of entries is the largest power of two that fits the memory budget, and a new entry simply
+    replaces whatever was stored in its slot.
+    """
+    entryBytes = 80  # rough cost of one slot in Python: two list slots, an int key and a float score
+
+    def __init__(self, megabytes):
+        self.name = "pawn"
+        self.hits = 0
+        self.probes = 0
+        self.resize(megabytes)
+
+    def resize(self, megabytes):
+        entries = max(1, int(megabytes * 1024 * 1024) // self.entryBytes)
+        size = 1 << (entries.bit_length() - 1)
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.scores = [0.0] * size
+
+    def probe(self, key):
+        """
+        Returns the cached score for key, or None on a miss.
+        """
+        self.probes += 1
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        return None
+
+    def store(self, key, score):
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
+
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+
+pawnHashTable = PawnHashTable(PAWN_HASH_MB)
+searchCaches.append(pawnHashTable)
+
+
+def loadWeights(path=WEIGHTS_FILE):
+    """
+    Replaces pieceScore and the piece-square tables with the weights in a file written by texelTuner.py.
+    Tables are stored from white's point of view, black's are mirrored.
+    """
+    import json  # only needed when there is a weights file, and slow enough to import to matter for workers
+
+    with open(path) as f:
+        weights = json.load(f)
+    pieceScore.update(weights["pieceScore"])
+    for pieceType, table in weights["pieceSquareTables"].items():
+        piecePositionScores["w" + pieceType] = table
+        piecePositionScores["b" + pieceType] = table[::-1]
+
+
+if os.path.exists(WEIGHTS_FILE):
+    loadWeights()
+
+
+class SearchResult:
+    """
+    Outcome of searchPosition. The score is relative to the side to move,
+    and pv is the principal variation: the best move followed by the expected replies.
+    lines holds the ranked (move, score, pv) of every line asked for with multiPV, the best first.
+    """
+
+    def __init__(self, bestMove, score, pv, depth, nodes, elapsed, stats, lines=None):
+        self.bestMove = bestMove
+        self.score = score
+        self.pv = pv
+        self.lines = lines if lines is not None else []
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.stats = stats
+
+    def linesAsDicts(self):
+        """
+        The ranked lines in the JSON friendly form the analysis tools report them in.
+        """
+        return [{"move": move.getUCINotation(), "san": str(move), "score": round(score, 2),
+                 "pv": [pvMove.getUCINotation() for pvMove in pv]} for move, score, pv in self.lines]
+
+
+class SearchStats:
+    """
+    Statistics of a single searchPosition call.
+    Node counts and the per-iteration log are always kept. The per-node counters (leaf nodes, cutoffs,
+    branching) and the time split are only collected when the search is instrumented.
+    There is no quiescence search, so leafNodes (evaluations at the horizon) is the closest equivalent
+    of a quiescence node count.
+    """
+
+    def __init__(self, instrumented=False):
+        self.instrumented = instrumented
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.iterations = []
+        self.leafNodes = 0
+        self.interiorNodes = 0
+        self.movesSearched = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.moveGenTime = 0.0
+        self.makeUnmakeTime = 0.0
+        self.evalTime = 0.0
+        self.caches = {}
+
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def cutoffRate(self):
+        """
+        Fraction of interior nodes that failed high.
+        """
+        return self.cutoffs / self.interiorNodes if self.interiorNodes else 0.0
+
+    def firstMoveCutoffRate(self):
+        """
+        Fraction of the cutoffs that happened on the first move searched, a measure of move ordering quality.
+        """
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def branchingFactor(self):
+        """
+        Average number of moves searched per interior node.
+        """
+        return self.movesSearched / self.interiorNodes if self.interiorNodes else 0.0
+
+    def effectiveBranchingFactor(self):
+        """
+        Growth in nodes between the last two completed iterations.
+        """
+        if len(self.iterations) < 2 or self.iterations[-2]["nodes"] == 0:
+            return 0.0
+        return self.iterations[-1]["nodes"] / self.iterations[-2]["nodes"]
+
+    def cacheHitRates(self):
+        return {name: hits / probes if probes else 0.0 for name, (hits, probes) in self.caches.items()}
+
+    def asDict(self):
+        stats = {"nodes": self.nodes, "time": self.elapsed, "nps": self.nps(), "iterations": self.iterations,
+                 "effectiveBranchingFactor": self.effectiveBranchingFactor(), "cacheHitRates": self.cacheHitRates()}
+        if self.instrumented:
+            stats.update(leafNodes=self.leafNodes, cutoffRate=self.cutoffRate(),
+                         firstMoveCutoffRate=self.firstMoveCutoffRate(), branchingFactor=self.branchingFactor(),
+                         moveGenTime=self.moveGenTime, makeUnmakeTime=self.makeUnmakeTime, evalTime=self.evalTime)
+        return stats
 
 
 def findBestMove(gs, validMoves, retQueue):
@@ -71,27 +247,183 @@ def findBestMove(gs, validMoves, retQueue):
     retQueue.put(nextMove)
 
 
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
+def findBestMoveFromBytes(position, retQueue):
+    """
+    findBestMove for a position encoded with GameState.toBytes, which is much cheaper to hand to
+    another process than a GameState with its whole move log.
+    """
+    gs = chessEngine.GameState.fromBytes(position)
+    findBestMove(gs, gs.getValidMoves(), retQueue)
+
+
+def searchPosition(gs, maxDepth=DEPTH, timeLimit=None, instrument=False, onIteration=None, stopEvent=None, multiPV=1):
+    """
+    Iterative deepening search used by the analysis tools.
+    Searches one ply deeper per iteration until maxDepth plies are done or timeLimit seconds have passed,
+    and reports the deepest completed iteration.
+    With instrument set the per-node statistics are collected as well, at some cost in speed.
+    onIteration, if given, is called with the SearchStats after every completed iteration.
+    stopEvent, if given, is an Event that ends the search like running out of time does.
+    multiPV is the number of best root moves to report with exact scores and lines in result.lines.
+    """
+    global nodeCount, searchDeadline, searchAborted, searchStopEvent, searchStats
+    if maxDepth is None:
+        if timeLimit is None:
+            raise ValueError("searchPosition needs a depth or a time limit")
+        maxDepth = MAX_DEPTH
+    if multiPV < 1:
+        raise ValueError("multiPV must be at least 1")
+    startTime = time.perf_counter()
+    nodeCount = 0
+    searchAborted = False
+    searchDeadline = None if timeLimit is None else startTime + timeLimit
+    searchStopEvent = stopEvent
+    stats = SearchStats(instrument)
+    searchStats = stats if instrument else None
+    cacheCounts = [(cache.hits, cache.probes) for cache in searchCaches]
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    validMoves = gs.getValidMoves()
+    staticScore = turnMultiplier * scoreBoard(gs)
+    result = SearchResult(validMoves[0] if validMoves else None, staticScore, validMoves[:1], 0, 0, 0.0, stats,
+                          [(move, staticScore, [move]) for move in validMoves[:multiPV]])
+    try:
+        if validMoves:
+            for depth in range(1, maxDepth + 1):
+                lines = searchRoot(gs, validMoves, depth, turnMultiplier, multiPV)
+                if searchAborted:
+                    break
+                move, score, pv = lines[0]
+                result.bestMove, result.score, result.pv, result.depth = move, score, pv, depth
+                result.lines = lines
+                stats.nodes = nodeCount
+                stats.elapsed = time.perf_counter() - startTime
+                previousNodes = stats.iterations[-1]["totalNodes"] if stats.iterations else 0
+                stats.iterations.append({"depth": depth, "time": stats.elapsed, "score": score,
+                                         "pv": [pvMove.getUCINotation() for pvMove in pv],
+                                         "nodes": nodeCount - previousNodes,
+                                         "totalNodes": nodeCount})
+                if multiPV > 1:
+                    stats.iterations[-1]["lines"] = result.linesAsDicts()
+                if onIteration is not None:
+                    onIteration(stats)
+                # Search the ranked moves first, in order, in the next iteration.
+                for lineMove, _, _ in reversed(lines):
+                    validMoves.remove(lineMove)
+                    validMoves.insert(0, lineMove)
+                if all(abs(lineScore) >= CHECKMATE for _, lineScore, _ in lines):
+                    break
+    finally:
+        # Leave no abort behind for findBestMove, which shares findMoveNegaMaxAlphaBeta.
+        searchDeadline = None
+        searchAborted = False
+        searchStopEvent = None
+        searchStats = None
+    result.nodes = stats.nodes = nodeCount
+    result.elapsed = stats.elapsed = time.perf_counter() - startTime
+    for cache, (hits, probes) in zip(searchCaches, cacheCounts):
+        stats.caches[cache.name] = (cache.hits - hits, cache.probes - probes)
+    return result
+
+
+def searchRoot(gs, validMoves, depth, turnMultiplier, multiPV=1):
+    """
+    Returns the best multiPV root moves as (move, score, pv), the best first.
+    Every move is searched against the score of the multiPV-th best so far rather than the best,
+    so the ranked moves get exact scores while the rest only have to be proven worse than them.
+    """
+    lines = []
+    alpha = -CHECKMATE
+    for move in validMoves:
+        line = []
+        nextMoves = makeMoveAndGenerate(gs, move)
+        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -CHECKMATE, -alpha, -turnMultiplier, line)
+        undoMove(gs)
+        if searchAborted:
+            break
+        if len(lines) < multiPV or score > alpha:
+            lines.append((move, score, [move] + line))
+            lines.sort(key=lambda entry: entry[1], reverse=True)
+            del lines[multiPV:]
+            if len(lines) == multiPV:
+                alpha = lines[-1][1]
+    return lines
+
+
+def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier, pvLine=None):
+    """
+    When pvLine is a list it is filled with the best line found from this position.
+    """
+    global nextMove, nodeCount, searchAborted
+    nodeCount += 1
+    if (searchDeadline is not None and time.perf_counter() > searchDeadline) or \
+            (searchStopEvent is not None and searchStopEvent.is_set()):
+        searchAborted = True
+        return 0
     if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
+        return turnMultiplier * evaluate(gs)
     maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
+    for i, move in enumerate(validMoves):
+        line = [] if pvLine is not None else None
+        nextMoves = makeMoveAndGenerate(gs, move)
+        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier, line)
+        undoMove(gs)
+        if searchAborted:
+            return 0
         if score > maxScore:
             maxScore = score
             if depth == DEPTH:
                 nextMove = move
-        gs.undoMove()
+            if pvLine is not None:
+                pvLine[:] = [move] + line
         if maxScore > alpha:
             alpha = maxScore
         if alpha >= beta:
+            if searchStats is not None:
+                searchStats.cutoffs += 1
+                if i == 0:
+                    searchStats.firstMoveCutoffs += 1
             break
+    if searchStats is not None and validMoves:
+        searchStats.interiorNodes += 1
+        searchStats.movesSearched += i + 1
     return maxScore
 
 
+def makeMoveAndGenerate(gs, move):
+    """
+    Makes a move and returns the valid moves of the resulting position, timing both when instrumented.
+    """
+    if searchStats is None:
+        gs.makeMove(move)
+        return gs.getValidMoves()
+    startTime = time.perf_counter()
+    gs.makeMove(move)
+    madeTime = time.perf_counter()
+    nextMoves = gs.getValidMoves()
+    searchStats.makeUnmakeTime += madeTime - startTime
+    searchStats.moveGenTime += time.perf_counter() - madeTime
+    return nextMoves
+
+
+def undoMove(gs):
+    if searchStats is None:
+        gs.undoMove()
+        return
+    startTime = time.perf_counter()
+    gs.undoMove()
+    searchStats.makeUnmakeTime += time.perf_counter() - startTime
+
+
+def evaluate(gs):
+    if searchStats is None:
+        return scoreBoard(gs)
+    startTime = time.perf_counter()
+    score = scoreBoard(gs)
+    searchStats.evalTime += time.perf_counter() - startTime
+    searchStats.leafNodes += 1
+    return score
+
+
 def scoreBoard(gs):
     """
     Score the board. A positive score is good for white, a negative score is good for black.
@@ -116,6 +448,47 @@ def scoreBoard(gs):
                 if piece[0] == "b":
                     score -= pieceScore[piece[1]] + piecePositionScore
 
+    return score + pawnStructureScore(gs)
+
+
+def pawnStructureScore(gs):
+    """
+    Doubled, isolated and passed pawn terms, positive when good for white.
+    Looked up in the pawn hash table first, since the pawns rarely change within a search.
+    """
+    score = pawnHashTable.probe(gs.pawnKey)
+    if score is None:
+        score = evaluatePawnStructure(gs.board)
+        pawnHashTable.store(gs.pawnKey, score)
+    return score
+
+
+def evaluatePawnStructure(board):
+    pawnRows = {"w": [[] for _ in range(8)], "b": [[] for _ in range(8)]}
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece[1] == "p":
+                pawnRows[piece[0]][col].append(row)
+    score = 0
+    for color, sign in (("w", 1), ("b", -1)):
+        ownRows = pawnRows[color]
+        enemyRows = pawnRows["b" if color == "w" else "w"]
+        for col in range(8):
+            if not ownRows[col]:
+                continue
+            score -= sign * doubledPawnPenalty * (len(ownRows[col]) - 1)
+            if (col == 0 or not ownRows[col - 1]) and (col == 7 or not ownRows[col + 1]):
+                score -= sign * isolatedPawnPenalty * len(ownRows[col])
+            for row in ownRows[col]:
+                # passed if no enemy pawn ahead of it on its own or an adjacent file
+                passed = True
+                for enemyCol in range(max(0, col - 1), min(7, col + 1) + 1):
+                    for enemyRow in enemyRows[enemyCol]:
+                        if (enemyRow < row) if color == "w" else (enemyRow > row):
+                            passed = False
+                if passed:
+                    score += sign * passedPawnScores[row if color == "w" else 7 - row]
     return score
 
 
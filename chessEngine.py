@@ -4,9 +4,34 @@ It's also responsible for determining the valid moves at the current state.
 It will also keep a move log.
 """
 
+import random
+import struct
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Random keys per pawn and square, xor-ed together into GameState.pawnKey. Fixed seed so keys match across processes.
+zobristRandom = random.Random(20240601)
+pawnZobristKeys = {piece: [[zobristRandom.getrandbits(64) for col in range(8)] for row in range(8)]
+                   for piece in ("wp", "bp")}
+
+# Binary position encoding used by GameState.toBytes/fromBytes: 32 bytes of board, flags, en-passant square, clocks.
+POSITION_FORMAT = "<32sBBHH"
+POSITION_SIZE = struct.calcsize(POSITION_FORMAT)
+pieceCodes = {"--": 0, "wp": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+              "bp": 9, "bN": 10, "bB": 11, "bR": 12, "bQ": 13, "bK": 14}
+codePieces = ["--"] * 16
+for piece, code in pieceCodes.items():
+    codePieces[code] = piece
+FLAG_WHITE_TO_MOVE = 1
+FLAG_WKS = 2
+FLAG_WQS = 4
+FLAG_BKS = 8
+FLAG_BQS = 16
+NO_SQUARE = 255
+
 
 class GameState:
-    def __init__(self):
+    def __init__(self, fen=None):
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
@@ -16,8 +41,7 @@ class GameState:
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
-        self.moveFunctions = {"p": self.getPawnMoves, "R": self.getRookMoves, "N": self.getKnightMoves,
-                              "B": self.getBishopMoves, "Q": self.getQueenMoves, "K": self.getKingMoves}
+        self.bindMoveFunctions()
         self.whiteToMove = True
         self.moveLog = []
         self.whiteKingLocation = (7, 4)
@@ -32,6 +56,174 @@ class GameState:
         self.castlingRights = CastleRights(True, True, True, True)
         self.castlingRightsLog = [CastleRights(self.castlingRights.wks, self.castlingRights.bks,
                                                self.castlingRights.wqs, self.castlingRights.bqs)]
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.pawnKey = self.computePawnKey()
+        self.pawnKeyLog = [self.pawnKey]
+        if fen is not None:
+            self.loadFEN(fen)
+
+    def bindMoveFunctions(self):
+        self.moveFunctions = {"p": self.getPawnMoves, "R": self.getRookMoves, "N": self.getKnightMoves,
+                              "B": self.getBishopMoves, "Q": self.getQueenMoves, "K": self.getKingMoves}
+
+    def loadFEN(self, fen):
+        """
+        Sets up the position described by a FEN string: pieces, side to move, castling rights,
+        en-passant square and clocks. The clocks are optional so EPD positions can be loaded too.
+        The move log is cleared, so moves made before loading cannot be undone.
+        """
+        fields = fen.split()
+        if len(fields) < 4 or fields[1] not in ("w", "b"):
+            raise ValueError("Invalid FEN: " + fen)
+        board = boardFromFEN(fields[0])
+        castling = fields[2]
+        if castling != "-" and any(c not in "KQkq" for c in castling):
+            raise ValueError("Invalid castling rights in FEN: " + fen)
+        enPassant = fields[3]
+        if enPassant == "-":
+            enPassantPossible = ()
+        elif len(enPassant) == 2 and enPassant[0] in Move.filesToCol and enPassant[1] in Move.ranksToRows:
+            enPassantPossible = (Move.ranksToRows[enPassant[1]], Move.filesToCol[enPassant[0]])
+        else:
+            raise ValueError("Invalid en-passant square in FEN: " + fen)
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Invalid clocks in FEN: " + fen) from None
+        self.setPosition(board, fields[1] == "w",
+                         CastleRights("K" in castling, "k" in castling, "Q" in castling, "q" in castling),
+                         enPassantPossible, halfmoveClock, fullmoveNumber)
+
+    def setPosition(self, board, whiteToMove, castlingRights, enPassantPossible, halfmoveClock, fullmoveNumber):
+        """
+        Replaces the whole position and clears the move log.
+        Castling rights whose king or rook is not on its home square are dropped.
+        """
+        whiteKing = blackKing = None
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] == "wK":
+                    whiteKing = (row, col)
+                elif board[row][col] == "bK":
+                    blackKing = (row, col)
+        if whiteKing is None or blackKing is None:
+            raise ValueError("The position must contain both kings")
+        if any(piece[1] == "p" for piece in board[0] + board[7]):
+            raise ValueError("Pawns cannot stand on the first or last rank")
+        if halfmoveClock < 0 or fullmoveNumber < 0:
+            raise ValueError("The halfmove clock and fullmove number cannot be negative")
+        self.board = board
+        self.whiteKingLocation = whiteKing
+        self.blackKingLocation = blackKing
+        self.whiteToMove = whiteToMove
+        self.castlingRights = CastleRights(
+            castlingRights.wks and board[7][4] == "wK" and board[7][7] == "wR",
+            castlingRights.bks and board[0][4] == "bK" and board[0][7] == "bR",
+            castlingRights.wqs and board[7][4] == "wK" and board[7][0] == "wR",
+            castlingRights.bqs and board[0][4] == "bK" and board[0][0] == "bR")
+        self.enPassantPossible = enPassantPossible
+        self.halfmoveClock = halfmoveClock
+        self.fullmoveNumber = fullmoveNumber
+        self.moveLog = []
+        self.checkmate = False
+        self.stalemate = False
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
+        self.enPassantPossibleLog = [self.enPassantPossible]
+        self.castlingRightsLog = [CastleRights(self.castlingRights.wks, self.castlingRights.bks,
+                                               self.castlingRights.wqs, self.castlingRights.bqs)]
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.pawnKey = self.computePawnKey()
+        self.pawnKeyLog = [self.pawnKey]
+
+    def toBytes(self):
+        """
+        Encodes the position (not the move log) into POSITION_SIZE bytes: two squares per byte as 4 bit piece codes,
+        then a flags byte (side to move, castling rights), the en-passant square and both clocks.
+        Raises ValueError if a clock does not fit in its 16 bits.
+        """
+        if not (0 <= self.halfmoveClock <= 0xFFFF and 0 <= self.fullmoveNumber <= 0xFFFF):
+            raise ValueError("The clocks do not fit in the binary position format")
+        squares = [pieceCodes[piece] for row in self.board for piece in row]
+        board = bytes(squares[i] | squares[i + 1] << 4 for i in range(0, 64, 2))
+        flags = (FLAG_WHITE_TO_MOVE if self.whiteToMove else 0) | \
+                (FLAG_WKS if self.castlingRights.wks else 0) | (FLAG_WQS if self.castlingRights.wqs else 0) | \
+                (FLAG_BKS if self.castlingRights.bks else 0) | (FLAG_BQS if self.castlingRights.bqs else 0)
+        enPassant = self.enPassantPossible[0] * 8 + self.enPassantPossible[1] if self.enPassantPossible else NO_SQUARE
+        return struct.pack(POSITION_FORMAT, board, flags, enPassant, self.halfmoveClock, self.fullmoveNumber)
+
+    @classmethod
+    def fromBytes(cls, data, offset=0):
+        """
+        Decodes a position written by toBytes. data may be any buffer, such as a memoryview of shared memory,
+        and is read in place at the given offset.
+        """
+        board, flags, enPassant, halfmoveClock, fullmoveNumber = struct.unpack_from(POSITION_FORMAT, data, offset)
+        squares = []
+        for byte in board:
+            squares.append(codePieces[byte & 0x0F])
+            squares.append(codePieces[byte >> 4])
+        # Skip __init__: setPosition sets everything but the move functions, so setting up the start position first
+        # would be wasted work on what should be the cheap path.
+        gs = cls.__new__(cls)
+        gs.bindMoveFunctions()
+        gs.setPosition([squares[row * 8:row * 8 + 8] for row in range(8)], bool(flags & FLAG_WHITE_TO_MOVE),
+                       CastleRights(bool(flags & FLAG_WKS), bool(flags & FLAG_BKS), bool(flags & FLAG_WQS),
+                                    bool(flags & FLAG_BQS)),
+                       divmod(enPassant, 8) if enPassant != NO_SQUARE else (), halfmoveClock, fullmoveNumber)
+        return gs
+
+    def computePawnKey(self):
+        """
+        Hash of the pawn placement only, used to cache pawn structure evaluations.
+        makeMove and undoMove keep self.pawnKey up to date incrementally.
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece[1] == "p":
+                    key ^= pawnZobristKeys[piece][row][col]
+        return key
+
+    def getFEN(self):
+        """
+        Serializes the current position as a FEN string.
+        """
+        rows = []
+        for row in self.board:
+            rowString = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                else:
+                    if empty > 0:
+                        rowString += str(empty)
+                        empty = 0
+                    rowString += piece[1].upper() if piece[0] == "w" else piece[1].lower()
+            if empty > 0:
+                rowString += str(empty)
+            rows.append(rowString)
+        castling = ""
+        if self.castlingRights.wks:
+            castling += "K"
+        if self.castlingRights.wqs:
+            castling += "Q"
+        if self.castlingRights.bks:
+            castling += "k"
+        if self.castlingRights.bqs:
+            castling += "q"
+        if self.enPassantPossible:
+            enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]]
+        else:
+            enPassant = "-"
+        return " ".join(["/".join(rows), "w" if self.whiteToMove else "b", castling or "-", enPassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)])
 
     # Does not work for special moves like En-passant, Castling and Pawn Promotion
     def makeMove(self, move):
@@ -71,6 +263,23 @@ class GameState:
         self.castlingRightsLog.append(CastleRights(self.castlingRights.wks, self.castlingRights.bks,
                                                    self.castlingRights.wqs, self.castlingRights.bqs))
 
+        if move.pieceMoved[1] == "p" or move.isCapture:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if self.whiteToMove:  # black just moved
+            self.fullmoveNumber += 1
+
+        if move.pieceMoved[1] == "p":
+            self.pawnKey ^= pawnZobristKeys[move.pieceMoved][move.startRow][move.startCol]
+            if not move.isPawnPromotion:
+                self.pawnKey ^= pawnZobristKeys[move.pieceMoved][move.endRow][move.endCol]
+        if move.pieceCaptured[1] == "p":
+            captureRow = move.startRow if move.isEnpassantMove else move.endRow
+            self.pawnKey ^= pawnZobristKeys[move.pieceCaptured][captureRow][move.endCol]
+        self.pawnKeyLog.append(self.pawnKey)
+
     def undoMove(self):
         # Making sure there is at-least a move to undo.
         if len(self.moveLog) != 0:
@@ -94,7 +303,17 @@ class GameState:
             self.enPassantPossible = self.enPassantPossibleLog[-1]
 
             self.castlingRightsLog.pop()
-            self.castlingRights = self.castlingRightsLog[-1]
+            # Copy the entry: updateCastleRights edits self.castlingRights in place on the next move.
+            lastRights = self.castlingRightsLog[-1]
+            self.castlingRights = CastleRights(lastRights.wks, lastRights.bks, lastRights.wqs, lastRights.bqs)
+
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if not self.whiteToMove:  # undoing black's move
+                self.fullmoveNumber -= 1
+
+            self.pawnKeyLog.pop()
+            self.pawnKey = self.pawnKeyLog[-1]
 
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:
@@ -119,7 +338,7 @@ class GameState:
             elif move.endCol == 7:
                 self.castlingRights.bks = False
 
-        if move.pieceMoved == "wk":
+        if move.pieceMoved == "wK":
             self.castlingRights.wqs = False
             self.castlingRights.wks = False
         elif move.pieceMoved == "bK":
@@ -190,7 +409,7 @@ class GameState:
             self.checkmate = False
             self.stalemate = False
         self.castlingRights = castleRights
-        return moves
+        return MoveList(moves)
 
     """
     Determines if the player is in check.
@@ -520,6 +739,138 @@ class GameState:
                 moves.append(Move((row, col), (row, col - 2), self.board, isCastleMove=True))
 
 
+def boardFromFEN(placement):
+    """
+    Converts the piece placement field of a FEN string into an 8x8 board of "wp"/"bK"/"--" strings.
+    """
+    rows = placement.split("/")
+    if len(rows) != 8:
+        raise ValueError("Invalid FEN piece placement: " + placement)
+    board = []
+    for rowString in rows:
+        row = []
+        for c in rowString:
+            if c.isdigit():
+                row.extend(["--"] * int(c))
+            elif c.upper() in "PNBRQK":
+                pieceType = "p" if c.upper() == "P" else c.upper()
+                row.append(("w" if c.isupper() else "b") + pieceType)
+            else:
+                raise ValueError("Invalid FEN piece placement: " + placement)
+        if len(row) != 8:
+            raise ValueError("Invalid FEN piece placement: " + placement)
+        board.append(row)
+    return board
+
+
+class MoveList(list):
+    """
+    The valid moves of a position, as returned by getValidMoves.
+    It behaves like a plain list, and also offers constant time lookups by start square, by start and end square,
+    and by notation. The lookup indexes are built on first use and reflect the moves in the list at that time.
+    """
+
+    def __init__(self, moves=()):
+        super().__init__(moves)
+        self.movesByStart = None
+        self.movesByID = None
+        self.movesByEnd = None
+
+    def __reduce__(self):
+        # The indexes are cheap to rebuild, so don't send them to other processes.
+        return MoveList, (list(self),)
+
+    def buildIndexes(self):
+        self.movesByStart = {}
+        self.movesByID = {}
+        self.movesByEnd = {}
+        for move in self:
+            self.movesByStart.setdefault((move.startRow, move.startCol), []).append(move)
+            self.movesByID[move.moveID] = move
+            self.movesByEnd.setdefault((move.endRow, move.endCol, move.pieceMoved[1]), []).append(move)
+
+    def movesFrom(self, row, col):
+        """
+        All the moves of the piece on the given square.
+        """
+        if self.movesByStart is None:
+            self.buildIndexes()
+        return self.movesByStart.get((row, col), [])
+
+    def find(self, startSq, endSq):
+        """
+        The move from startSq to endSq, or None if there is no such valid move.
+        """
+        if self.movesByID is None:
+            self.buildIndexes()
+        return self.movesByID.get(startSq[0] * 1000 + startSq[1] * 100 + endSq[0] * 10 + endSq[1])
+
+    def movesTo(self, row, col, pieceType):
+        """
+        All the moves of pieces of the given type ("p", "N", ...) ending on the given square.
+        """
+        if self.movesByEnd is None:
+            self.buildIndexes()
+        return self.movesByEnd.get((row, col, pieceType), [])
+
+    def fromUCI(self, notation):
+        """
+        Resolves long algebraic notation such as "e2e4" or "e7e8q" to the matching valid move.
+        Raises ValueError if there is no such valid move.
+        """
+        if len(notation) not in (4, 5) or notation[0] not in Move.filesToCol or notation[1] not in Move.ranksToRows \
+                or notation[2] not in Move.filesToCol or notation[3] not in Move.ranksToRows:
+            raise ValueError("Invalid UCI move: " + notation)
+        if len(notation) == 5 and notation[4].lower() != "q":
+            raise ValueError("Under-promotion is not supported by the engine: " + notation)
+        move = self.find((Move.ranksToRows[notation[1]], Move.filesToCol[notation[0]]),
+                         (Move.ranksToRows[notation[3]], Move.filesToCol[notation[2]]))
+        if move is None:
+            raise ValueError("Illegal move: " + notation)
+        return move
+
+    def fromSAN(self, san):
+        """
+        Resolves standard algebraic notation such as "Nf3", "exd5", "O-O" or "e8=Q+" to the matching valid move.
+        Raises ValueError if no valid move matches or the notation is ambiguous.
+        """
+        notation = san.rstrip("+#!?")
+        if notation in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            endCol = 6 if len(notation) == 3 else 2
+            for move in self:
+                if move.isCastleMove and move.endCol == endCol:
+                    return move
+            raise ValueError("Illegal move: " + san)
+        # Parsed by hand rather than with re, which would noticeably slow down importing the engine.
+        promotion = None
+        if "=" in notation:
+            notation, promotion = notation.split("=", 1)
+        elif len(notation) > 2 and notation[-1] in "NBRQ":
+            notation, promotion = notation[:-1], notation[-1]
+        piece = notation[0] if notation[:1] in ("N", "B", "R", "Q", "K") else None
+        endSquare = notation[-2:]
+        disambiguation = notation[1 if piece else 0:-2]
+        if disambiguation.endswith("x"):
+            disambiguation = disambiguation[:-1]
+        fromFile = disambiguation[0] if disambiguation[:1] in Move.filesToCol else None
+        fromRank = disambiguation[-1] if disambiguation[-1:] in Move.ranksToRows else None
+        if len(endSquare) != 2 or endSquare[0] not in Move.filesToCol or endSquare[1] not in Move.ranksToRows or \
+                len(disambiguation) != (fromFile is not None) + (fromRank is not None) or \
+                promotion not in (None, "N", "B", "R", "Q") or (promotion is not None and piece is not None):
+            raise ValueError("Invalid SAN: " + san)
+        if promotion is not None and promotion != "Q":
+            raise ValueError("Under-promotion is not supported by the engine: " + san)
+        candidates = [move for move in self.movesTo(Move.ranksToRows[endSquare[1]], Move.filesToCol[endSquare[0]],
+                                                    piece or "p")
+                      if (fromFile is None or move.startCol == Move.filesToCol[fromFile]) and
+                      (fromRank is None or move.startRow == Move.ranksToRows[fromRank])]
+        if len(candidates) == 1:
+            return candidates[0]
+        if not candidates:
+            raise ValueError("Illegal move: " + san)
+        raise ValueError("Ambiguous move: " + san)
+
+
 class CastleRights:
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
@@ -587,6 +938,13 @@ class Move:
             else:
                 return self.pieceMoved[1] + self.getRankFile(self.endRow, self.endCol)
 
+    def getUCINotation(self):
+        """
+        Long algebraic notation as used by UCI, e.g. "e2e4" or "e7e8q".
+        """
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        return notation + "q" if self.isPawnPromotion else notation
+
     def getRankFile(self, row, col):
         return self.colsToFiles[col] + self.rowsToRanks[row]
 
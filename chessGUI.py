@@ -0,0 +1,412 @@
+"""
+The graphical interface, started by main.py.
+It will be responsible for handling user input and displaying the current GameState object.
+"""
+
+import os
+import sys
+import time
+from multiprocessing import Process, Queue
+
+import pygame as p
+
+import chessAI
+import chessEngine
+
+WIDTH = HEIGHT = 512
+MOVE_LOG_PANEL_HEIGHT = 250
+MOVE_LOG_PANEL_WIDTH = WIDTH
+DIMENSION = 8
+SQ_SIZE = HEIGHT // DIMENSION
+MAX_FPS = 30
+ANIMATION_SECONDS_PER_SQUARE = 1 / 6
+
+IMAGES = {}
+colors = [p.Color("white"), p.Color("aquamarine3")]
+
+
+def load_images():
+    """
+    Loads the piece images as subsurfaces of one sprite atlas scaled to SQ_SIZE.
+    The atlas is cached in images/cache, and only rebuilt from the individual PNGs when it is missing or older
+    than one of them.
+    """
+    pieces = ["wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK"]
+    sources = ["images/" + piece + ".png" for piece in pieces]
+    atlasPath = "images/cache/atlas_" + str(SQ_SIZE) + ".png"
+    try:
+        if os.path.getmtime(atlasPath) < max(os.path.getmtime(source) for source in sources):
+            raise FileNotFoundError(atlasPath)
+        atlas = p.image.load(atlasPath)
+    except (OSError, p.error):
+        atlas = p.Surface((SQ_SIZE * len(pieces), SQ_SIZE), p.SRCALPHA)
+        for i, source in enumerate(sources):
+            atlas.blit(p.transform.scale(p.image.load(source), (SQ_SIZE, SQ_SIZE)), (i * SQ_SIZE, 0))
+        try:
+            os.makedirs(os.path.dirname(atlasPath), exist_ok=True)
+            p.image.save(atlas, atlasPath)
+        except (OSError, p.error):
+            pass  # the cache is only an optimization
+    atlas = atlas.convert_alpha()
+    for i, piece in enumerate(pieces):
+        IMAGES[piece] = atlas.subsurface(p.Rect(i * SQ_SIZE, 0, SQ_SIZE, SQ_SIZE))
+
+
+def main(exitAfterFirstFrame=False):
+    """
+    Runs the game. exitAfterFirstFrame is used by the benchmark to time cold start to the first frame.
+    """
+    global retQueue
+    p.init()
+    screen = p.display.set_mode((WIDTH + MOVE_LOG_PANEL_WIDTH, HEIGHT))
+    clock = p.time.Clock()
+    screen.fill(p.Color("white"))
+    gs = chessEngine.GameState()
+    validMoves = gs.getValidMoves()
+    moveMade = False
+    animate = False
+    load_images()
+    running = True
+    sqSelected = ()
+    playerClicks = []
+    gameOver = False
+    aiThinking = False
+    moveUndone = False
+    moveFinder = None
+    moveLogFont = p.font.SysFont("Arial", 14, False, False)
+    moveLogPanel = MoveLogPanel(moveLogFont)
+    renderer = BoardRenderer()
+    p.display.flip()
+    p1 = True
+    p2 = False
+    while running:
+        humanTurn = (gs.whiteToMove and p1) or (not gs.whiteToMove and p2)
+        for e in p.event.get():
+            if e.type == p.QUIT:
+                p.quit()
+                sys.exit()
+            # Mouse handler
+            elif e.type == p.MOUSEWHEEL:
+                if moveLogPanel.rect.collidepoint(p.mouse.get_pos()):
+                    moveLogPanel.scroll(-e.y)
+            elif e.type == p.MOUSEBUTTONDOWN:
+                if not gameOver and e.button not in (4, 5):  # 4 and 5 are the mouse wheel
+                    location = p.mouse.get_pos()
+                    col = location[0] // SQ_SIZE
+                    row = location[1] // SQ_SIZE
+                    if sqSelected == (row, col) or col >= 8:
+                        sqSelected = ()
+                        playerClicks = []
+                    else:
+                        sqSelected = (row, col)
+                        playerClicks.append(sqSelected)
+                    if len(playerClicks) == 2 and humanTurn:
+                        move = validMoves.find(playerClicks[0], playerClicks[1])
+                        if move is not None:
+                            gs.makeMove(move)
+                            moveMade = True
+                            animate = True
+                            sqSelected = ()
+                            playerClicks = []
+                        if not moveMade:
+                            playerClicks = [sqSelected]
+            elif e.type == p.KEYDOWN:
+                # Undoing when 'z' is pressed.
+                if e.key == p.K_z:
+                    gs.undoMove()
+                    moveMade = True
+                    animate = False
+                    if gameOver:
+                        renderer.invalidate()
+                    gameOver = False
+                    if aiThinking:
+                        moveFinder.terminate()
+                        aiThinking = False
+                    moveUndone = True
+                # Resetting when 'r' is pressed.
+                if e.key == p.K_r:
+                    gs = chessEngine.GameState()
+                    validMoves = gs.getValidMoves()
+                    sqSelected = ()
+                    playerClicks = []
+                    moveMade = False
+                    animate = False
+                    if gameOver:
+                        renderer.invalidate()
+                    gameOver = False
+                    if aiThinking:
+                        moveFinder.terminate()
+                        aiThinking = False
+                    moveUndone = False
+
+        if not gameOver and not humanTurn and not moveUndone:
+            if not aiThinking:
+                aiThinking = True
+                retQueue = Queue()
+                moveFinder = Process(target=chessAI.findBestMoveFromBytes, args=(gs.toBytes(), retQueue))
+                moveFinder.start()
+            if not moveFinder.is_alive():
+                aiMove = retQueue.get()
+                if aiMove is None:
+                    chessAI.findRandomMove(validMoves)
+                gs.makeMove(aiMove)
+                moveMade = True
+                animate = True
+                aiThinking = False
+
+        if moveMade:
+            if animate:
+                animateMove(gs.moveLog[-1], screen, gs.board, clock)
+                renderer.invalidate()
+            validMoves = gs.getValidMoves()
+            moveMade = False
+            animate = False
+            moveUndone = False
+
+        dirtyRects = renderer.draw(screen, gs, validMoves, sqSelected)
+
+        moveLogPanel.update(gs.moveLog)
+        moveLogRect = moveLogPanel.draw(screen)
+        if moveLogRect is not None:
+            dirtyRects.append(moveLogRect)
+
+        if (gs.checkmate or gs.stalemate) and not gameOver:
+            gameOver = True
+            if gs.stalemate:
+                drawEndgameText(screen, "Stalemate")
+            elif gs.whiteToMove:
+                drawEndgameText(screen, "Black wins by checkmate!")
+            else:
+                drawEndgameText(screen, "White wins by checkmate!")
+            dirtyRects.append(p.Rect(0, 0, WIDTH, HEIGHT))
+
+        clock.tick(MAX_FPS)
+        if dirtyRects:
+            p.display.update(dirtyRects)
+        if exitAfterFirstFrame:
+            p.quit()
+            return
+
+
+class BoardRenderer:
+    """
+    Draws the board using dirty rectangles.
+    The empty board is rendered once into a background surface, and every frame only the squares whose piece or
+    highlights changed since the last frame are redrawn, so a static board costs next to nothing.
+    """
+
+    def __init__(self):
+        self.background = p.Surface((WIDTH, HEIGHT))
+        drawBoard(self.background)
+        self.highlights = {}
+        for color in ("green", "blue", "yellow"):
+            s = p.Surface((SQ_SIZE, SQ_SIZE))
+            s.set_alpha(100)
+            s.fill(p.Color(color))
+            self.highlights[color] = s
+        self.drawn = None
+
+    def invalidate(self):
+        """
+        Forces a full redraw on the next frame, for when something else has drawn over the board.
+        """
+        self.drawn = None
+
+    def draw(self, screen, gs, validMoves, sqSelected):
+        """
+        Redraws the squares that changed and returns their rectangles for p.display.update.
+        """
+        if self.drawn is None:
+            self.drawn = [[None] * DIMENSION for _ in range(DIMENSION)]
+        highlights = self.squareHighlights(gs, validMoves, sqSelected)
+        dirtyRects = []
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                state = (gs.board[row][col], highlights.get((row, col), ()))
+                if self.drawn[row][col] != state:
+                    rect = p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+                    screen.blit(self.background, rect, rect)
+                    for color in state[1]:
+                        screen.blit(self.highlights[color], rect)
+                    if state[0] != "--":
+                        screen.blit(IMAGES[state[0]], rect)
+                    self.drawn[row][col] = state
+                    dirtyRects.append(rect)
+        return dirtyRects
+
+    def squareHighlights(self, gs, validMoves, sqSelected):
+        """
+        Maps squares to the highlight colors drawn on them, in drawing order.
+        """
+        highlights = {}
+        if len(gs.moveLog) > 0:
+            lastMove = gs.moveLog[-1]
+            highlights[(lastMove.endRow, lastMove.endCol)] = ("green",)
+        if sqSelected != ():
+            row, col = sqSelected
+            if gs.board[row][col][0] == ("w" if gs.whiteToMove else "b"):
+                highlights[(row, col)] = highlights.get((row, col), ()) + ("blue",)
+                for move in validMoves.movesFrom(row, col):
+                    square = (move.endRow, move.endCol)
+                    highlights[square] = highlights.get(square, ()) + ("yellow",)
+        return highlights
+
+
+def drawBoard(screen):
+    for row in range(DIMENSION):
+        for col in range(DIMENSION):
+            color = colors[((row + col) % 2)]
+            p.draw.rect(screen, color, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+
+
+def drawPieces(screen, board):
+    for row in range(DIMENSION):
+        for col in range(DIMENSION):
+            piece = board[row][col]
+            if piece != "--":
+                screen.blit(IMAGES[piece], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+
+
+class MoveLogPanel:
+    """
+    The scrollable move log panel.
+    The lines of the log are kept up to date incrementally as moves are made and undone, only the visible lines are
+    rendered (and cached until they change), and the panel is only redrawn when the log or the scroll position changes.
+    """
+    movesPerRow = 3
+    padding = 5
+    lineSpacing = 2
+
+    def __init__(self, font):
+        self.rect = p.Rect(WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
+        self.font = font
+        self.lineHeight = font.get_height() + self.lineSpacing
+        self.visibleLines = max(1, (MOVE_LOG_PANEL_HEIGHT - self.padding) // self.lineHeight)
+        self.moves = []  # the logged moves the panel currently shows
+        self.moveTexts = []  # one string per full move, e.g. "1. e4 e5  "
+        self.lineSurfaces = {}  # rendered lines, only kept for the visible ones
+        self.scrollLine = 0
+        self.dirty = True
+
+    def lineCount(self):
+        return (len(self.moveTexts) + self.movesPerRow - 1) // self.movesPerRow
+
+    def maxScroll(self):
+        return max(0, self.lineCount() - self.visibleLines)
+
+    def update(self, moveLog):
+        """
+        Brings the panel in line with the move log, touching only the moves that were undone or made since
+        the last call.
+        """
+        if len(self.moves) == len(moveLog) and (not moveLog or self.moves[-1] is moveLog[-1]):
+            return
+        following = self.scrollLine >= self.maxScroll()
+        while self.moves and (len(self.moves) > len(moveLog) or self.moves[-1] is not moveLog[len(self.moves) - 1]):
+            self.moves.pop()
+            self.updateMoveText(len(self.moves))
+        while len(self.moves) < len(moveLog):
+            self.moves.append(moveLog[len(self.moves)])
+            self.updateMoveText(len(self.moves) - 1)
+        if following or self.scrollLine > self.maxScroll():
+            self.scrollLine = self.maxScroll()
+        self.dirty = True
+
+    def updateMoveText(self, ply):
+        """
+        Rebuilds the text of the full move containing the given ply after it was made or undone.
+        """
+        moveNumber = ply // 2
+        del self.moveTexts[moveNumber:]
+        firstPly = moveNumber * 2
+        if firstPly < len(self.moves):
+            moveString = str(moveNumber + 1) + ". " + str(self.moves[firstPly]) + " "
+            if firstPly + 1 < len(self.moves):
+                moveString += str(self.moves[firstPly + 1]) + "  "
+            self.moveTexts.append(moveString)
+        self.lineSurfaces.pop(moveNumber // self.movesPerRow, None)
+
+    def scroll(self, lines):
+        scrollLine = min(max(self.scrollLine + lines, 0), self.maxScroll())
+        if scrollLine != self.scrollLine:
+            self.scrollLine = scrollLine
+            self.dirty = True
+
+    def draw(self, screen):
+        """
+        Redraws the panel if it changed, returning its rectangle for p.display.update, or None.
+        """
+        if not self.dirty:
+            return None
+        p.draw.rect(screen, p.Color("black"), self.rect)
+        lastLine = min(self.lineCount(), self.scrollLine + self.visibleLines)
+        visibleSurfaces = {}
+        textY = self.padding
+        for line in range(self.scrollLine, lastLine):
+            textObject = self.lineSurfaces.get(line)
+            if textObject is None:
+                first = line * self.movesPerRow
+                text = "".join(self.moveTexts[first:first + self.movesPerRow])
+                textObject = self.font.render(text, True, p.Color("white"))
+            visibleSurfaces[line] = textObject
+            screen.blit(textObject, self.rect.move(self.padding, textY))
+            textY += self.lineHeight
+        self.lineSurfaces = visibleSurfaces
+        self.dirty = False
+        return self.rect
+
+
+def drawEndgameText(screen, text):
+    font = p.font.SysFont("Helvetica", 32, True, False)
+    textObject = font.render(text, False, p.Color("grey"))
+    textLocation = p.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH / 2 - textObject.get_width() / 2, HEIGHT / 2 - textObject.get_height() / 2)
+    screen.blit(textObject, textLocation)
+    textObject = font.render(text, False, p.Color("black"))
+    screen.blit(textObject, textLocation.move(2, 2))
+
+
+def animateMove(move, screen, board, clock):
+    """
+    Slides the moved piece from its start square to its end square.
+    The board without the moving piece is drawn once into a snapshot, and every frame only restores the snapshot
+    under the old sprite position and draws the sprite at the new one. The duration depends on the distance moved,
+    not on how fast frames get drawn.
+    """
+    dRow = move.endRow - move.startRow
+    dCol = move.endCol - move.startCol
+    duration = (abs(dRow) + abs(dCol)) * ANIMATION_SECONDS_PER_SQUARE
+    boardRect = p.Rect(0, 0, WIDTH, HEIGHT)
+    drawBoard(screen)
+    drawPieces(screen, board)
+    # erase the piece moved from its ending square
+    color = colors[(move.endRow + move.endCol) % 2]
+    endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    p.draw.rect(screen, color, endSquare)
+    # draw captured piece onto rectangle
+    if move.pieceCaptured != '--':
+        if move.isEnpassantMove:
+            enPassantRow = move.endRow + 1 if move.pieceCaptured[0] == 'b' else move.endRow - 1
+            endSquare = p.Rect(move.endCol * SQ_SIZE, enPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        screen.blit(IMAGES[move.pieceCaptured], endSquare)
+    background = screen.subsurface(boardRect).copy()
+    sprite = IMAGES[move.pieceMoved]
+    spriteRect = p.Rect(move.startCol * SQ_SIZE, move.startRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    screen.blit(sprite, spriteRect)
+    p.display.update(boardRect)
+    startTime = time.perf_counter()
+    progress = 0
+    while progress < 1:
+        clock.tick(60)
+        p.event.pump()
+        progress = min(1, (time.perf_counter() - startTime) / duration) if duration > 0 else 1
+        # draw moving piece
+        newRect = p.Rect(round((move.startCol + dCol * progress) * SQ_SIZE),
+                         round((move.startRow + dRow * progress) * SQ_SIZE), SQ_SIZE, SQ_SIZE)
+        screen.blit(background, spriteRect, spriteRect)
+        screen.blit(sprite, newRect)
+        p.display.update(spriteRect.union(newRect))
+        spriteRect = newRect
+
+
+if __name__ == "__main__":
+    main()
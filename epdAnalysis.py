@@ -0,0 +1,160 @@
+"""
+Batch analysis of EPD/FEN files.
+Positions are streamed from the input one line at a time, searched over a pool of worker processes
+and written out as JSON lines (one per position, in input order) as soon as they are done.
+The main process parses each line and hands the position to the workers through a SharedPositionBuffer,
+so only a slot number is sent with each task.
+
+Usage: python epdAnalysis.py positions.epd -o results.jsonl --depth 3 --movetime 2 --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chessAI
+import chessEngine
+from parallel import SharedPositionBuffer, boundedMap
+
+sharedPositions = None  # the worker's view of the main process's SharedPositionBuffer
+
+
+def parseEPD(line):
+    """
+    Splits an EPD (or FEN) line into a FEN string and a dict of EPD operations.
+    The "hmvc" and "fmvn" operations, when present, are used for the clocks.
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("Invalid EPD: " + line)
+    rest = fields[4] if len(fields) > 4 else ""
+    restFields = rest.split()
+    if len(restFields) >= 2 and restFields[0].isdigit() and restFields[1].isdigit():
+        # A plain FEN line with clocks, possibly followed by operations.
+        clocks = restFields[:2]
+        rest = rest.split(None, 2)[2] if len(restFields) > 2 else ""
+    else:
+        clocks = None
+    ops = {}
+    for op in rest.split(";"):
+        op = op.strip()
+        if op:
+            parts = op.split(None, 1)
+            ops[parts[0]] = parts[1].strip().strip('"') if len(parts) > 1 else ""
+    if clocks is None:
+        clocks = [ops.get("hmvc", "0"), ops.get("fmvn", "1")]
+    return " ".join(fields[:4] + clocks), ops
+
+
+def attachPositions(name):
+    """
+    Worker initializer: attaches to the shared position buffer created by main.
+    """
+    global sharedPositions
+    sharedPositions = SharedPositionBuffer(name=name)
+
+
+def analyzePosition(task):
+    lineNumber, slot, info, depth, moveTime, withStats, multiPV = task
+    result = {"line": lineNumber}
+    result.update(info)
+    if "error" in info:
+        return result
+    gs = sharedPositions.get(slot)
+    result["fen"] = gs.getFEN()
+    try:
+        search = chessAI.searchPosition(gs, depth, moveTime, instrument=withStats, multiPV=multiPV)
+    except Exception as e:
+        # One position the engine cannot handle must not end a run over a whole file.
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+        return result
+    move = search.bestMove
+    result["bestmove"] = move.getUCINotation() if move is not None else None
+    result["san"] = str(move) if move is not None else None
+    result["pv"] = [pvMove.getUCINotation() for pvMove in search.pv]
+    result["score"] = round(search.score, 2)
+    result["depth"] = search.depth
+    result["nodes"] = search.nodes
+    result["time"] = round(search.elapsed, 3)
+    if multiPV > 1:
+        result["lines"] = search.linesAsDicts()
+    if withStats:
+        result["stats"] = search.stats.asDict()
+    return result
+
+
+def readTasks(inputFile, positions, depth, moveTime, withStats, multiPV):
+    """
+    Parses the input lines and writes their positions into the slots of positions in turn.
+    Lines that cannot be parsed become tasks that only carry the error.
+    Reusing a slot is safe as long as there are no more tasks in flight than slots, which boundedMap ensures
+    when its window is at most positions.slots.
+    """
+    slot = 0
+    for lineNumber, line in enumerate(inputFile, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        info = {}
+        try:
+            fen, ops = parseEPD(line)
+            if "id" in ops:
+                info["id"] = ops["id"]
+            positions.put(slot, chessEngine.GameState(fen))
+        except ValueError as e:
+            info["error"] = str(e)
+            yield lineNumber, None, info, depth, moveTime, withStats, multiPV
+            continue
+        yield lineNumber, slot, info, depth, moveTime, withStats, multiPV
+        slot = (slot + 1) % positions.slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze every position of an EPD or FEN file.")
+    parser.add_argument("input", help="EPD/FEN file, one position per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="where to write the JSON lines results (default stdout)")
+    parser.add_argument("--depth", type=int, default=None, help="maximum search depth per position "
+                        "(default %d, or no limit when --movetime is given)" % chessAI.DEPTH)
+    parser.add_argument("--movetime", type=float, default=None, help="time budget per position in seconds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--stats", action="store_true", help="include detailed search statistics in the results")
+    parser.add_argument("--multipv", type=int, default=1, help="number of ranked best moves to report per position")
+    args = parser.parse_args()
+    if args.depth is None and args.movetime is None:
+        args.depth = chessAI.DEPTH
+    if args.multipv < 1:
+        parser.error("--multipv must be at least 1")
+
+    inputFile = sys.stdin if args.input == "-" else open(args.input)
+    outputFile = sys.stdout if args.output == "-" else open(args.output, "w")
+    window = args.workers * 4
+    positions = SharedPositionBuffer(window)
+    startTime = time.perf_counter()
+    count = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=attachPositions,
+                                 initargs=(positions.name,)) as executor:
+            tasks = readTasks(inputFile, positions, args.depth, args.movetime, args.stats, args.multipv)
+            for result in boundedMap(executor, analyzePosition, tasks, window):
+                outputFile.write(json.dumps(result) + "\n")
+                outputFile.flush()
+                count += 1
+                if count % 100 == 0:
+                    elapsed = time.perf_counter() - startTime
+                    print("%d positions, %.1f positions/s" % (count, count / elapsed), file=sys.stderr)
+    finally:
+        positions.close()
+        positions.unlink()
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+    elapsed = time.perf_counter() - startTime
+    print("Analyzed %d positions in %.1fs" % (count, elapsed), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,251 +1,10 @@
 """
 This is the main driver file.
-It will be responsible for handling user input and displaying the current GameState object.
+The interface itself lives in chessGUI. Keeping pygame out of this module means processes started with the
+"spawn" method, which re-import the main module, don't import pygame just to run the AI.
 """
 
-import sys
-from multiprocessing import Process, Queue
-
-import pygame as p
-
-import chessAI
-import chessEngine
-
-WIDTH = HEIGHT = 512
-MOVE_LOG_PANEL_HEIGHT = 250
-MOVE_LOG_PANEL_WIDTH = WIDTH
-DIMENSION = 8
-SQ_SIZE = HEIGHT // DIMENSION
-MAX_FPS = 30
-
-IMAGES = {}
-colors = [p.Color("white"), p.Color("aquamarine3")]
-
-
-def load_images():
-    pieces = ["wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK"]
-    for piece in pieces:
-        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
-
-
-def main():
-    global retQueue
-    p.init()
-    screen = p.display.set_mode((WIDTH + MOVE_LOG_PANEL_WIDTH, HEIGHT))
-    clock = p.time.Clock()
-    screen.fill(p.Color("white"))
-    gs = chessEngine.GameState()
-    validMoves = gs.getValidMoves()
-    moveMade = False
-    animate = False
-    load_images()
-    running = True
-    sqSelected = ()
-    playerClicks = []
-    gameOver = False
-    aiThinking = False
-    moveUndone = False
-    moveFinder = None
-    moveLogFont = p.font.SysFont("Arial", 14, False, False)
-    p1 = True
-    p2 = False
-    while running:
-        humanTurn = (gs.whiteToMove and p1) or (not gs.whiteToMove and p2)
-        for e in p.event.get():
-            if e.type == p.QUIT:
-                p.quit()
-                sys.exit()
-            # Mouse handler
-            elif e.type == p.MOUSEBUTTONDOWN:
-                if not gameOver:
-                    location = p.mouse.get_pos()
-                    col = location[0] // SQ_SIZE
-                    row = location[1] // SQ_SIZE
-                    if sqSelected == (row, col) or col >= 8:
-                        sqSelected = ()
-                        playerClicks = []
-                    else:
-                        sqSelected = (row, col)
-                        playerClicks.append(sqSelected)
-                    if len(playerClicks) == 2 and humanTurn:
-                        move = chessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
-                        for i in range(len(validMoves)):
-                            if move == validMoves[i]:
-                                gs.makeMove(validMoves[i])
-                                moveMade = True
-                                animate = True
-                                sqSelected = ()
-                                playerClicks = []
-                        if not moveMade:
-                            playerClicks = [sqSelected]
-            elif e.type == p.KEYDOWN:
-                # Undoing when 'z' is pressed.
-                if e.key == p.K_z:
-                    gs.undoMove()
-                    moveMade = True
-                    animate = False
-                    gameOver = False
-                    if aiThinking:
-                        moveFinder.terminate()
-                        aiThinking = False
-                    moveUndone = True
-                # Resetting when 'r' is pressed.
-                if e.key == p.K_r:
-                    gs = chessEngine.GameState()
-                    validMoves = gs.getValidMoves()
-                    sqSelected = ()
-                    playerClicks = []
-                    moveMade = False
-                    animate = False
-                    gameOver = False
-                    if aiThinking:
-                        moveFinder.terminate()
-                        aiThinking = False
-                    moveUndone = False
-
-        if not gameOver and not humanTurn and not moveUndone:
-            if not aiThinking:
-                aiThinking = True
-                retQueue = Queue()
-                moveFinder = Process(target=chessAI.findBestMove, args=(gs, validMoves, retQueue))
-                moveFinder.start()
-            if not moveFinder.is_alive():
-                aiMove = retQueue.get()
-                if aiMove is None:
-                    chessAI.findRandomMove(validMoves)
-                gs.makeMove(aiMove)
-                moveMade = True
-                animate = True
-                aiThinking = False
-
-        if moveMade:
-            if animate:
-                animateMove(gs.moveLog[-1], screen, gs.board, clock)
-            validMoves = gs.getValidMoves()
-            moveMade = False
-            animate = False
-            moveUndone = False
-
-        drawGameState(screen, gs, validMoves, sqSelected)
-
-        if not gameOver:
-            drawMoveLog(screen, gs, moveLogFont)
-
-        if gs.checkmate:
-            gameOver = True
-            if gs.whiteToMove:
-                drawEndgameText(screen, "Black wins by checkmate!")
-            else:
-                drawEndgameText(screen, "White wins by checkmate!")
-
-        elif gs.stalemate:
-            gameOver = True
-            drawEndgameText(screen, "Stalemate")
-
-        clock.tick(MAX_FPS)
-        p.display.flip()
-
-
-def drawGameState(screen, gs, validMoves, sqSelected):
-    drawBoard(screen)
-    highlightSquare(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs.board)
-
-
-def drawBoard(screen):
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            color = colors[((row + col) % 2)]
-            p.draw.rect(screen, color, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-
-def highlightSquare(screen, gs, validMoves, sqSelected):
-    if len(gs.moveLog) > 0:
-        lastMove = gs.moveLog[-1]
-        s = p.Surface((SQ_SIZE, SQ_SIZE))
-        s.set_alpha(100)
-        s.fill(p.Color("green"))
-        screen.blit(s, (lastMove.endCol * SQ_SIZE, lastMove.endRow * SQ_SIZE))
-    if sqSelected != ():
-        row, col = sqSelected
-        if gs.board[row][col][0] == ("w" if gs.whiteToMove else "b"):
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100)
-            s.fill(p.Color("blue"))
-            screen.blit(s, (col * SQ_SIZE, row * SQ_SIZE))
-            s.fill(p.Color("yellow"))
-            for move in validMoves:
-                if move.startRow == row and move.startCol == col:
-                    screen.blit(s, (move.endCol * SQ_SIZE, move.endRow * SQ_SIZE))
-
-
-def drawPieces(screen, board):
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            piece = board[row][col]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-
-def drawMoveLog(screen, gs, font):
-    moveLogRect = p.Rect(WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
-    p.draw.rect(screen, p.Color("black"), moveLogRect)
-    moveLog = gs.moveLog
-    moveTexts = []
-    for i in range(0, len(moveLog), 2):
-        moveString = str(i // 2 + 1) + ". " + str(moveLog[i]) + " "
-        if i + 1 < len(moveLog):
-            moveString += str(moveLog[i + 1]) + "  "
-        moveTexts.append(moveString)
-    movesPerRow = 3
-    padding = 5
-    lineSpacing = 2
-    textY = padding
-    for i in range(0, len(moveTexts), movesPerRow):
-        text = ""
-        for j in range(movesPerRow):
-            if i + j < len(moveTexts):
-                text += moveTexts[i + j]
-
-        textObject = font.render(text, True, p.Color("white"))
-        textLocation = moveLogRect.move(padding, textY)
-        screen.blit(textObject, textLocation)
-        textY += textObject.get_height() + lineSpacing
-
-
-def drawEndgameText(screen, text):
-    font = p.font.SysFont("Helvetica", 32, True, False)
-    textObject = font.render(text, False, p.Color("grey"))
-    textLocation = p.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH / 2 - textObject.get_width() / 2, HEIGHT / 2 - textObject.get_height() / 2)
-    screen.blit(textObject, textLocation)
-    textObject = font.render(text, False, p.Color("black"))
-    screen.blit(textObject, textLocation.move(2, 2))
-
-
-def animateMove(move, screen, board, clock):
-    dRow = move.endRow - move.startRow
-    dCol = move.endCol - move.startCol
-    framePerSquare = 10
-    frameCount = (abs(dRow) + abs(dCol)) * framePerSquare
-    for frame in range(frameCount + 1):
-        row, col = (move.startRow + dRow * frame / frameCount, move.startCol + dCol * frame / frameCount)
-        drawBoard(screen)
-        drawPieces(screen, board)
-        # erase the piece moved from its ending square
-        color = colors[(move.endRow + move.endCol) % 2]
-        endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        p.draw.rect(screen, color, endSquare)
-        # draw captured piece onto rectangle
-        if move.pieceCaptured != '--':
-            if move.isEnpassantMove:
-                enPassantRow = move.endRow + 1 if move.pieceCaptured[0] == 'b' else move.endRow - 1
-                endSquare = p.Rect(move.endCol * SQ_SIZE, enPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
-        # draw moving piece
-        screen.blit(IMAGES[move.pieceMoved], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
-        clock.tick(60)
-
-
 if __name__ == "__main__":
-    main()
+    import chessGUI
+
+    chessGUI.main()
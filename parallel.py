@@ -0,0 +1,55 @@
+"""
+Helpers for fanning work out over a pool of worker processes.
+"""
+
+from collections import deque
+from multiprocessing import shared_memory
+
+import chessEngine
+
+
+def boundedMap(executor, fn, iterable, window):
+    """
+    Like executor.map, but only keeps `window` tasks in flight at a time.
+    The input is consumed lazily, so memory stays flat no matter how long it is.
+    Results are yielded in input order.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class SharedPositionBuffer:
+    """
+    Slots of positions in the GameState.toBytes format, kept in shared memory.
+    The owner creates the buffer and writes positions with put; worker processes attach to it by name and
+    decode positions with get straight from the shared memory, without the position being pickled or copied.
+    """
+
+    def __init__(self, slots=None, name=None):
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=max(1, slots) * chessEngine.POSITION_SIZE)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.slots = self.memory.size // chessEngine.POSITION_SIZE
+
+    def put(self, slot, gs):
+        offset = slot * chessEngine.POSITION_SIZE
+        self.memory.buf[offset:offset + chessEngine.POSITION_SIZE] = gs.toBytes()
+
+    def get(self, slot):
+        return chessEngine.GameState.fromBytes(self.memory.buf, slot * chessEngine.POSITION_SIZE)
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Frees the shared memory; only the creating process should call this, after close.
+        """
+        self.memory.unlink()
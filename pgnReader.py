@@ -0,0 +1,179 @@
+"""
+Streaming PGN reader.
+Games are read from the file in chunks and replayed through the engine one at a time, so archives of any size
+can be processed with flat memory. Every SAN move is resolved against getValidMoves, which makes a run over
+a large archive a correctness check of the move generator as well.
+
+Usage: python pgnReader.py games.pgn --workers 4
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chessEngine
+from parallel import boundedMap
+
+TAG_PATTERN = re.compile(r'\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+COMMENT_PATTERN = re.compile(r"\{[^}]*\}|;[^\n]*")
+VARIATION_PATTERN = re.compile(r"\([^()]*\)")
+NOISE_PATTERN = re.compile(r"\$\d+|\d+\.(\.\.)?")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class Game:
+    def __init__(self, headers, moves, result):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+
+def readGameTexts(f, chunkSize=1 << 20):
+    """
+    Reads a PGN file in chunks and yields the raw text of one game at a time.
+    A game ends where the tag section of the next one starts.
+    """
+    gameLines = []
+    seenMoves = False
+    leftover = ""
+    while True:
+        chunk = f.read(chunkSize)
+        if chunk:
+            lines = (leftover + chunk).split("\n")
+            leftover = lines.pop()
+        else:
+            lines = [leftover]
+        for line in lines:
+            stripped = line.strip()
+            if stripped.startswith("["):
+                if seenMoves:
+                    yield "\n".join(gameLines)
+                    gameLines = []
+                    seenMoves = False
+            elif stripped:
+                seenMoves = True
+            gameLines.append(line)
+        if not chunk:
+            break
+    if seenMoves:
+        yield "\n".join(gameLines)
+
+
+def parseGame(text):
+    """
+    Splits the text of a single game into its tags and the list of SAN moves of the main line.
+    Comments, variations, NAGs and move numbers are dropped.
+    """
+    headers = dict(TAG_PATTERN.findall(text))
+    moveText = "\n".join(line for line in text.split("\n") if not line.lstrip().startswith(("[", "%")))
+    moveText = COMMENT_PATTERN.sub(" ", moveText)
+    while True:
+        stripped = VARIATION_PATTERN.sub(" ", moveText)
+        if stripped == moveText:
+            break
+        moveText = stripped
+    moveText = NOISE_PATTERN.sub(" ", moveText)
+    moves = []
+    result = headers.get("Result", "*")
+    for token in moveText.split():
+        if token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return Game(headers, moves, result)
+
+
+def replayGame(game):
+    """
+    Replays a game through the engine, yielding (gs, move) before each move is made.
+    The same GameState object is reused for every position, so copy what you need (e.g. gs.getFEN()).
+    Raises ValueError at the first move the engine considers illegal.
+    """
+    gs = chessEngine.GameState(game.headers["FEN"]) if "FEN" in game.headers else chessEngine.GameState()
+    for ply, san in enumerate(game.moves):
+        try:
+            move = gs.getValidMoves().fromSAN(san)
+        except ValueError as e:
+            raise ValueError("ply %d (%s): %s" % (ply + 1, gs.getFEN(), e)) from None
+        yield gs, move
+        gs.makeMove(move)
+
+
+def readGames(path, chunkSize=1 << 20):
+    """
+    Lazily yields every game of a PGN file as a Game.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for text in readGameTexts(f, chunkSize):
+            yield parseGame(text)
+
+
+def validateGames(batch):
+    """
+    Worker entry point: replays a batch of (game number, game text) pairs and reports on each game.
+    """
+    reports = []
+    for number, text in batch:
+        report = {"game": number}
+        plies = 0
+        try:
+            game = parseGame(text)
+            report.update(event=game.headers.get("Event"), white=game.headers.get("White"),
+                          black=game.headers.get("Black"), result=game.result)
+            for _ in replayGame(game):
+                plies += 1
+            report["plies"] = plies
+        except (ValueError, KeyError) as e:
+            report["error"] = str(e)
+        except Exception as e:
+            # A crash in the engine itself is a move generator bug worth flagging, not a reason to stop.
+            report["error"] = "engine error at ply %d: %s: %s" % (plies + 1, type(e).__name__, e)
+            report["errorType"] = type(e).__name__
+        reports.append(report)
+    return reports
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay every game of a PGN file and flag illegal moves.")
+    parser.add_argument("input", help="PGN file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--batch", type=int, default=32, help="games sent to a worker at a time")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="bytes read from the file at a time")
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    games = plies = flagged = 0
+    with open(args.input, encoding="utf-8", errors="replace") as f, \
+            ProcessPoolExecutor(max_workers=args.workers) as executor:
+        batches = batched(enumerate(readGameTexts(f, args.chunk_size), 1), args.batch)
+        for reports in boundedMap(executor, validateGames, batches, args.workers * 2):
+            for report in reports:
+                games += 1
+                plies += report.get("plies", 0)
+                if "error" in report:
+                    flagged += 1
+                    print(json.dumps(report), flush=True)
+            elapsed = time.perf_counter() - startTime
+            print("%d games, %.1f games/s" % (games, games / elapsed), file=sys.stderr)
+    elapsed = time.perf_counter() - startTime
+    print("Replayed %d games (%d plies) in %.1fs, %.1f games/s, %d flagged" %
+          (games, plies, elapsed, games / elapsed if elapsed else 0, flagged), file=sys.stderr)
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
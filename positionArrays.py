@@ -0,0 +1,57 @@
+"""
+Bulk handling of positions in the binary format of GameState.toBytes, as NumPy structured arrays.
+The same records are used on disk for position datasets and books: a file is just the records back to back,
+so it can be memory-mapped with loadPositions and sliced without parsing.
+"""
+
+import numpy as np
+
+import chessEngine
+
+POSITION_DTYPE = np.dtype([("board", np.uint8, 32), ("flags", np.uint8), ("enPassant", np.uint8),
+                           ("halfmoveClock", "<u2"), ("fullmoveNumber", "<u2")])
+assert POSITION_DTYPE.itemsize == chessEngine.POSITION_SIZE
+
+
+def encodePositions(states):
+    """
+    Encodes an iterable of GameStates into a structured array.
+    """
+    data = b"".join(gs.toBytes() for gs in states)
+    return np.frombuffer(data, dtype=POSITION_DTYPE).copy()
+
+
+def decodePositions(positions):
+    """
+    Lazily yields a GameState for every record of a structured array, decoding straight from its buffer.
+    """
+    buffer = memoryview(np.ascontiguousarray(positions)).cast("B")
+    for offset in range(0, len(positions) * chessEngine.POSITION_SIZE, chessEngine.POSITION_SIZE):
+        yield chessEngine.GameState.fromBytes(buffer, offset)
+
+
+def unpackBoards(positions):
+    """
+    Returns an (n, 64) array of the piece codes (chessEngine.pieceCodes) on every square, row by row from a8.
+    """
+    boards = np.empty((len(positions), 64), dtype=np.uint8)
+    boards[:, 0::2] = positions["board"] & 0x0F
+    boards[:, 1::2] = positions["board"] >> 4
+    return boards
+
+
+def whiteToMove(positions):
+    return (positions["flags"] & chessEngine.FLAG_WHITE_TO_MOVE) != 0
+
+
+def savePositions(path, positions):
+    positions.astype(POSITION_DTYPE, copy=False).tofile(path)
+
+
+def loadPositions(path, mmap=True):
+    """
+    Opens a file written by savePositions, memory-mapped read-only by default.
+    """
+    if mmap:
+        return np.memmap(path, dtype=POSITION_DTYPE, mode="r")
+    return np.fromfile(path, dtype=POSITION_DTYPE)
@@ -0,0 +1,204 @@
+"""
+Texel-style tuning of the material values and piece-square tables used by chessAI.scoreBoard.
+A labeled position set is loaded once into a feature matrix, and the weights are fitted by minimizing the
+squared error between the game results and a sigmoid of the evaluation with vectorized gradient steps.
+The tuned weights are written to a JSON file that chessAI loads at startup.
+
+Input: one position per line, a FEN (or EPD) followed by the game result from white's point of view,
+e.g. "... w KQkq - 0 1 1-0", "... [0.5]" or '... c9 "1/2-1/2";'. Numeric results must be bracketed or quoted,
+since a bare digit cannot be told apart from the fullmove number.
+
+Usage: python texelTuner.py positions.txt --epochs 200 -o weights.json
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+
+import numpy as np
+
+import chessAI
+import chessEngine
+
+PIECE_TYPES = ("p", "N", "B", "R", "Q")
+TYPE_INDEXES = {pieceType: typeIndex for typeIndex, pieceType in enumerate(PIECE_TYPES)}
+FEATURE_COUNT = len(PIECE_TYPES) * 65  # material count plus 64 squares per piece type
+RESULT = r"1-0|0-1|1/2-1/2|[01](?:\.\d*)?|\.\d+"
+RESULT_PATTERN = re.compile(r'\s(?:c9\s+)?(?:"(%s)"|\[(%s)\]|(1-0|0-1|1/2-1/2));?\s*$' % (RESULT, RESULT))
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+
+def parseLabeledLine(line):
+    """
+    Returns the piece placement field and the result of one line of the position set.
+    """
+    match = RESULT_PATTERN.search(line)
+    fields = line[:match.start()].split() if match else []
+    if len(fields) < 2:
+        raise ValueError("Expected a FEN followed by a result: " + line)
+    result = next(group for group in match.groups() if group is not None)
+    if result in RESULTS:
+        return fields[0], RESULTS[result]
+    if not 0.0 <= float(result) <= 1.0:
+        raise ValueError("Result must be between 0 and 1: " + line)
+    return fields[0], float(result)
+
+
+def positionFeatures(board, features):
+    """
+    Fills a feature row for a board: white minus black piece counts, and per piece type and square the number of
+    white minus black pieces on it, with black's squares mirrored like piecePositionScores does.
+    """
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece == "--" or piece[1] == "K":
+                continue
+            typeIndex = TYPE_INDEXES[piece[1]]
+            if piece[0] == "w":
+                features[typeIndex] += 1
+                features[len(PIECE_TYPES) + typeIndex * 64 + row * 8 + col] += 1
+            else:
+                features[typeIndex] -= 1
+                features[len(PIECE_TYPES) + typeIndex * 64 + (7 - row) * 8 + col] -= 1
+
+
+def loadPositions(path, chunkSize=65536):
+    """
+    Reads the position set into an int8 feature matrix, the (untuned) pawn structure scores and the results.
+    """
+    chunks, offsetChunks, resultChunks = [], [], []
+    features = np.zeros((chunkSize, FEATURE_COUNT), dtype=np.int8)
+    offsets = np.zeros(chunkSize, dtype=np.float32)
+    results = np.zeros(chunkSize, dtype=np.float32)
+    count = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            placement, result = parseLabeledLine(line)
+            board = chessEngine.boardFromFEN(placement)
+            positionFeatures(board, features[count])
+            offsets[count] = chessAI.evaluatePawnStructure(board)
+            results[count] = result
+            count += 1
+            if count == chunkSize:
+                chunks.append(features)
+                offsetChunks.append(offsets)
+                resultChunks.append(results)
+                features = np.zeros((chunkSize, FEATURE_COUNT), dtype=np.int8)
+                offsets = np.zeros(chunkSize, dtype=np.float32)
+                results = np.zeros(chunkSize, dtype=np.float32)
+                count = 0
+    chunks.append(features[:count])
+    offsetChunks.append(offsets[:count])
+    resultChunks.append(results[:count])
+    return np.concatenate(chunks), np.concatenate(offsetChunks), np.concatenate(resultChunks)
+
+
+def currentWeights():
+    """
+    The weights chessAI evaluates with right now, in feature order.
+    """
+    weights = np.zeros(FEATURE_COUNT, dtype=np.float32)
+    for typeIndex, pieceType in enumerate(PIECE_TYPES):
+        weights[typeIndex] = chessAI.pieceScore[pieceType]
+        table = np.array(chessAI.piecePositionScores["w" + pieceType], dtype=np.float32)
+        weights[len(PIECE_TYPES) + typeIndex * 64:len(PIECE_TYPES) + (typeIndex + 1) * 64] = table.reshape(64)
+    return weights
+
+
+def evaluations(features, offsets, weights, batchSize):
+    """
+    scoreBoard for every position, computed in batches so the int8 matrix is never converted whole.
+    """
+    scores = np.empty(len(features), dtype=np.float32)
+    for start in range(0, len(features), batchSize):
+        batch = features[start:start + batchSize].astype(np.float32)
+        scores[start:start + batchSize] = batch @ weights + offsets[start:start + batchSize]
+    return scores
+
+
+def sigmoid(scores, k):
+    return 1.0 / (1.0 + np.exp(-k * scores))
+
+
+def meanSquaredError(scores, results, k):
+    return float(np.mean((results - sigmoid(scores, k)) ** 2))
+
+
+def fitScaling(scores, results):
+    """
+    Finds the sigmoid scaling constant that best maps the current evaluations to results.
+    """
+    best = (meanSquaredError(scores, results, 1.0), 1.0)
+    for k in np.arange(0.1, 3.01, 0.05):
+        best = min(best, (meanSquaredError(scores, results, k), float(k)))
+    return best[1]
+
+
+def tune(features, offsets, results, weights, k, epochs, learningRate, batchSize):
+    """
+    Minimizes the mean squared error with Adam, using full passes over the data per step.
+    """
+    n = len(features)
+    m = np.zeros_like(weights)
+    v = np.zeros_like(weights)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    for epoch in range(1, epochs + 1):
+        gradient = np.zeros_like(weights)
+        squaredError = 0.0
+        for start in range(0, n, batchSize):
+            batch = features[start:start + batchSize].astype(np.float32)
+            predicted = sigmoid(batch @ weights + offsets[start:start + batchSize], k)
+            error = predicted - results[start:start + batchSize]
+            squaredError += float(error @ error)
+            gradient += batch.T @ (error * predicted * (1 - predicted))
+        gradient *= 2 * k / n
+        m = beta1 * m + (1 - beta1) * gradient
+        v = beta2 * v + (1 - beta2) * gradient * gradient
+        weights -= learningRate * (m / (1 - beta1 ** epoch)) / (np.sqrt(v / (1 - beta2 ** epoch)) + epsilon)
+        if epoch == 1 or epoch % 10 == 0 or epoch == epochs:
+            print("epoch %d: error %.6f" % (epoch, squaredError / n), file=sys.stderr)
+    return weights
+
+
+def saveWeights(weights, path):
+    tables = {}
+    for typeIndex, pieceType in enumerate(PIECE_TYPES):
+        table = weights[len(PIECE_TYPES) + typeIndex * 64:len(PIECE_TYPES) + (typeIndex + 1) * 64].reshape(8, 8)
+        tables[pieceType] = [[round(float(value), 4) for value in row] for row in table]
+    pieceScores = {pieceType: round(float(weights[typeIndex]), 4) for typeIndex, pieceType in enumerate(PIECE_TYPES)}
+    with open(path, "w") as f:
+        json.dump({"pieceScore": pieceScores, "pieceSquareTables": tables}, f, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune chessAI's material and piece-square weights on labeled positions.")
+    parser.add_argument("input", help="file of FEN/EPD lines each followed by the game result")
+    parser.add_argument("-o", "--output", default=chessAI.WEIGHTS_FILE, help="weights file to write")
+    parser.add_argument("--epochs", type=int, default=200, help="gradient steps, each a full pass over the data")
+    parser.add_argument("--learning-rate", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=65536, help="rows converted to floats at a time")
+    parser.add_argument("--k", type=float, default=None, help="sigmoid scaling, fitted to the data by default")
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    features, offsets, results = loadPositions(args.input)
+    print("Loaded %d positions in %.1fs" % (len(features), time.perf_counter() - startTime), file=sys.stderr)
+    if len(features) == 0:
+        sys.exit("No positions to tune on")
+    weights = currentWeights()
+    scores = evaluations(features, offsets, weights, args.batch_size)
+    k = args.k if args.k is not None else fitScaling(scores, results)
+    print("K = %.2f, initial error %.6f" % (k, meanSquaredError(scores, results, k)), file=sys.stderr)
+    weights = tune(features, offsets, results, weights, k, args.epochs, args.learning_rate, args.batch_size)
+    saveWeights(weights, args.output)
+    print("Tuned in %.1fs, weights written to %s" % (time.perf_counter() - startTime, args.output), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()